@@ -1,20 +1,73 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional, Tuple
+from typing import NamedTuple, Optional, Tuple, Union
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from .jwt_handler import jwt_handler
+from .user_cache import user_cache
+from .token_epochs import token_epochs
 from ..db.database import get_db
 from ..schemas.user import User
+from ..utils.config import get_settings
+
+settings = get_settings()
+
+# Authentication never needs the embedded attempt history or the password hash
+AUTH_USER_PROJECTION = {"quiz_attempts": 0, "hashed_password": 0}
 
 # HTTP Bearer token scheme
 security = HTTPBearer()
 
+
+class Principal(NamedTuple):
+    """The caller as described by a stateless access token's claims, and nothing more.
+
+    Handlers that need profile fields (name, email, stats) load the user
+    document themselves, so they never read defaults standing in for them.
+    """
+    id: str
+    is_admin: bool
+    epoch: int
+    # Disabling an account bumps its epoch, so a token that passes the epoch check is active
+    is_active: bool = True
+
+
+# What the authentication dependencies resolve to: the full user, or a Principal in stateless mode
+CurrentUser = Union[User, Principal]
+
+async def _load_user(db: AsyncIOMotorClient, user_id: str) -> Optional[User]:
+    """Resolve a user by id, served from the per-worker user cache when possible"""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, AUTH_USER_PROJECTION)
+    if user is None:
+        return None
+
+    user["_id"] = str(user["_id"])
+    resolved = User(**user)
+    user_cache.set(resolved)
+    return resolved
+
+async def _resolve_principal(db: AsyncIOMotorClient, payload: dict) -> Optional[CurrentUser]:
+    """Build the authenticated user from token claims (stateless mode) or the database"""
+    user_id = payload["sub"]
+    if not settings.stateless_auth:
+        return await _load_user(db, user_id)
+
+    # Disabling, role changes and password changes bump the epoch, revoking older tokens
+    epoch = payload.get("token_epoch", 0)
+    if not token_epochs.is_current(user_id, epoch):
+        return None
+
+    return Principal(id=user_id, is_admin=payload.get("is_admin", False), epoch=epoch)
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorClient = Depends(get_db)
-) -> User: # Get current authenticated user from JWT token
+) -> CurrentUser: # Get current authenticated user from JWT token
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -22,7 +75,7 @@ async def get_current_user(
     )
 
     try:
-        payload = jwt_handler.verify_token(credentials.credentials)
+        payload = await jwt_handler.verify_token(credentials.credentials, db)
         if payload is None:
             raise credentials_exception
 
@@ -43,24 +96,23 @@ async def get_current_user(
     if not ObjectId.is_valid(user_id):
         raise credentials_exception
 
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await _resolve_principal(db, payload)
     if user is None:
         raise credentials_exception
 
-    if not user.get("is_active", True):
+    if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User account is disabled"
         )
 
-    user["_id"] = str(user["_id"])
-    return User(**user)
+    return user
 
 
 async def get_current_user_with_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncIOMotorClient = Depends(get_db)
-) -> Tuple[User, str]:
+) -> Tuple[CurrentUser, str]:
     """Get current user and the raw token for logout purposes"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -69,7 +121,7 @@ async def get_current_user_with_token(
     )
 
     try:
-        payload = jwt_handler.verify_token(credentials.credentials)
+        payload = await jwt_handler.verify_token(credentials.credentials, db)
         if payload is None:
             raise credentials_exception
 
@@ -90,23 +142,22 @@ async def get_current_user_with_token(
     if not ObjectId.is_valid(user_id):
         raise credentials_exception
 
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
+    user = await _resolve_principal(db, payload)
     if user is None:
         raise credentials_exception
 
-    if not user.get("is_active", True):
+    if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User account is disabled"
         )
 
-    user["_id"] = str(user["_id"])
-    return User(**user), credentials.credentials
+    return user, credentials.credentials
 
 
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -115,8 +166,8 @@ async def get_current_admin_user(
     return current_user
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: CurrentUser = Depends(get_current_user)
+) -> CurrentUser:
     if not current_user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -127,12 +178,12 @@ async def get_current_active_user(
 async def get_optional_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
     db: AsyncIOMotorClient = Depends(get_db)
-) -> Optional[User]:  # Get current user if authenticated, None if not authenticated (for optional auth)
+) -> Optional[CurrentUser]:  # Get current user if authenticated, None if not authenticated (for optional auth)
     if credentials is None:
         return None
 
     try:
-        payload = jwt_handler.verify_token(credentials.credentials)
+        payload = await jwt_handler.verify_token(credentials.credentials, db)
         if payload is None:
             return None
 
@@ -140,12 +191,11 @@ async def get_optional_current_user(
         if user_id is None or not ObjectId.is_valid(user_id):
             return None
 
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
-        if user is None or not user.get("is_active", True):
+        user = await _resolve_principal(db, payload)
+        if user is None or not user.is_active:
             return None
 
-        user["_id"] = str(user["_id"])
-        return User(**user)
+        return user
 
     except Exception:
         return None
@@ -153,7 +203,7 @@ async def get_optional_current_user(
 # Utility function to get user ID from token
 def get_user_id_from_token(token: str) -> Optional[str]: # Extract user ID from JWT token without database verification
     try:
-        payload = jwt_handler.verify_token(token)
+        payload = jwt_handler.decode_token(token)
         if payload is None:
             return None
         return payload.get("sub")
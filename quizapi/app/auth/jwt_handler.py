@@ -1,7 +1,10 @@
 from jose import jwt, JWTError, ExpiredSignatureError
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
-from typing import Optional, Dict, Any, Set
+from typing import Optional, Dict, Any
+from motor.motor_asyncio import AsyncIOMotorClient
+from .revocation import revocation_store
+from ..utils.cache import TTLCache
 from ..utils.config import get_settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -12,10 +15,13 @@ class JWTHandler:
         self.settings = get_settings()
         self.secret_key = getattr(self.settings, 'secret_key', 'your-secret-key-change-in-production')
         self.algorithm = "HS256"
-        self.access_token_expire_minutes = 30
+        # Shared with token_epochs, which must remember bumps for as long as older tokens stay valid
+        self.access_token_expire_minutes = self.settings.access_token_expire_minutes
         self.refresh_token_expire_days = 7
-        # In-memory blacklist (in production, use Redis or database)
-        self.blacklisted_tokens: Set[str] = set()
+        # Revoked jtis live in Mongo behind a per-worker Bloom filter
+        self.revocation_store = revocation_store
+        # Decoded payloads keyed by raw token, kept until the token's exp
+        self.token_cache = TTLCache(maxsize=self.settings.token_cache_size)
 
     def create_access_token(self, data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
         """Create JWT access token"""
@@ -34,7 +40,7 @@ class JWTHandler:
         encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
         return encoded_jwt
 
-    def create_refresh_token(self, data: Dict[str, Any]) -> str:
+    def create_refresh_token(self, data: Dict[str, Any], jti: Optional[str] = None) -> str:
         """Create JWT refresh token"""
         to_encode = data.copy()
         expire = datetime.now(timezone.utc) + timedelta(days=self.refresh_token_expire_days)
@@ -43,61 +49,69 @@ class JWTHandler:
             "exp": expire,
             "iat": datetime.now(timezone.utc),
             "type": "refresh",
-            "jti": f"{data.get('sub')}_refresh_{datetime.now(timezone.utc).timestamp()}"
+            "jti": jti or f"{data.get('sub')}_refresh_{datetime.now(timezone.utc).timestamp()}"
         })
         encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
         return encoded_jwt
 
-    def verify_token(self, token: str) -> Optional[Dict[str, Any]]:
-        """Verify and decode JWT token, checking blacklist"""
+    def decode_uncached(self, token: str) -> Optional[Dict[str, Any]]:
+        """Decode a JWT without touching the token cache, e.g. long-lived refresh tokens"""
         try:
-            # First check if token is blacklisted
-            if self.is_token_blacklisted(token):
-                return None
+            return jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except (JWTError, ExpiredSignatureError):
+            return None
 
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+    def decode_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """Decode JWT token once and cache the payload until it expires"""
+        payload = self.token_cache.get(token)
+        if payload is not None:
+            return payload
 
-            # Check if the JTI is blacklisted
-            jti = payload.get('jti')
-            if jti and jti in self.blacklisted_tokens:
-                return None
+        payload = self.decode_uncached(token)
+        if payload is None:
+            return None
 
-            return payload
-        except ExpiredSignatureError:
+        exp = payload.get('exp')
+        if exp is not None:
+            self.token_cache.set(token, payload, expires_at=exp)
+        return payload
+
+    async def verify_token(self, token: str, db: AsyncIOMotorClient) -> Optional[Dict[str, Any]]:
+        """Verify and decode JWT token, checking blacklist"""
+        payload = self.decode_token(token)
+        if payload is None:
             return None
-        except JWTError:
+
+        jti = payload.get('jti')
+        if jti and await self.revocation_store.is_revoked(db, jti):
             return None
 
-    def blacklist_token(self, token: str) -> bool:
+        return payload
+
+    async def blacklist_token(self, token: str, db: AsyncIOMotorClient) -> bool:
         """Add token to blacklist"""
-        try:
-            # Decode token to get JTI
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            jti = payload.get('jti')
-
-            if jti:
-                self.blacklisted_tokens.add(jti)
-                return True
-            return False
-        except (JWTError, ExpiredSignatureError):
-            # Even if token is expired or invalid, we can try to blacklist the raw token
-            self.blacklisted_tokens.add(token)
+        payload = self.decode_token(token)
+        self.token_cache.pop(token)
+
+        if payload is None:
+            # Expired or invalid tokens can no longer authenticate, nothing to persist
             return True
 
-    def is_token_blacklisted(self, token: str) -> bool:
+        jti = payload.get('jti')
+        if jti:
+            await self.revocation_store.revoke(db, jti, payload['exp'])
+            return True
+        return False
+
+    async def is_token_blacklisted(self, token: str, db: AsyncIOMotorClient) -> bool:
         """Check if token is blacklisted"""
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            jti = payload.get('jti')
-            return jti in self.blacklisted_tokens if jti else token in self.blacklisted_tokens
-        except (JWTError, ExpiredSignatureError):
-            return token in self.blacklisted_tokens
+        payload = self.decode_token(token)
+        jti = payload.get('jti') if payload else None
+        return bool(jti) and await self.revocation_store.is_revoked(db, jti)
 
-    def cleanup_expired_tokens(self):
-        """Remove expired tokens from blacklist (should be run periodically)"""
-        # This is a simple cleanup - in production, you'd want more sophisticated cleanup
-        # For now, we'll keep all tokens in blacklist until server restart
-        pass
+    async def cleanup_expired_tokens(self, db: AsyncIOMotorClient):
+        """Drop expired tokens from the in-memory blacklist filter (Mongo expires them via TTL index)"""
+        await self.revocation_store.rebuild(db)
 
     def hash_password(self, password: str) -> str:
         """Hash password using bcrypt"""
@@ -0,0 +1,126 @@
+import math
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from ..utils.cache import TTLCache
+from ..utils.config import get_settings
+
+
+class MemoryRateLimitBackend:
+    """Per-worker token buckets stored as (tokens, updated_at) tuples in a bounded LRU"""
+
+    def __init__(self, max_keys: int):
+        self.buckets = TTLCache(maxsize=max_keys)
+
+    async def hit(self, db: AsyncIOMotorClient, key: str, limit: int, window: int) -> float:
+        """Take one token; return 0 when allowed, otherwise seconds until a token is available"""
+        now = time.time()
+        rate = limit / window
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            tokens = float(limit)
+        else:
+            tokens = min(float(limit), bucket[0] + (now - bucket[1]) * rate)
+
+        # A bucket untouched for a whole window is full again, so it can be dropped
+        if tokens < 1:
+            self.buckets.set(key, (tokens, now), expires_at=now + window)
+            return (1 - tokens) / rate
+
+        self.buckets.set(key, (tokens - 1, now), expires_at=now + window)
+        return 0.0
+
+
+class MongoRateLimitBackend:
+    """Sliding-window counters in the rate_limits collection, shared by every worker"""
+
+    async def hit(self, db: AsyncIOMotorClient, key: str, limit: int, window: int) -> float:
+        now = time.time()
+        current = int(now // window)
+        elapsed = now - current * window
+
+        doc = await db.rate_limits.find_one_and_update(
+            {"_id": f"{key}:{current}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {"expires_at": datetime.fromtimestamp((current + 2) * window, timezone.utc)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        previous = await db.rate_limits.find_one({"_id": f"{key}:{current - 1}"}, {"count": 1})
+        previous_count = previous["count"] if previous else 0
+
+        # Weight the previous window by how much of it still overlaps the sliding window
+        estimated = previous_count * (window - elapsed) / window + doc["count"]
+        if estimated > limit:
+            return window - elapsed
+        return 0.0
+
+
+class AuthRateLimiter:
+    """Admission control for the bcrypt-heavy login and register endpoints.
+
+    Requests are limited per client IP and per email before any password
+    hashing starts. Rejections raise 429 with a Retry-After header.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        if self.settings.rate_limit_backend == "mongo":
+            self.backend = MongoRateLimitBackend()
+        else:
+            self.backend = MemoryRateLimitBackend(self.settings.rate_limit_max_keys)
+
+    def client_ip(self, request: Request) -> str:
+        if self.settings.rate_limit_trust_forwarded_for:
+            forwarded_for = request.headers.get("x-forwarded-for")
+            if forwarded_for:
+                return forwarded_for.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    async def check(
+        self,
+        db: AsyncIOMotorClient,
+        request: Request,
+        scope: str,
+        email: Optional[str],
+        per_ip: int,
+        per_email: int
+    ) -> None:
+        if not self.settings.rate_limit_enabled:
+            return
+
+        window = self.settings.rate_limit_window_seconds
+        retry_after = await self.backend.hit(db, f"{scope}:ip:{self.client_ip(request)}", per_ip, window)
+        if not retry_after and email:
+            retry_after = await self.backend.hit(db, f"{scope}:email:{email.lower()}", per_email, window)
+
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+    async def check_login(self, db: AsyncIOMotorClient, request: Request, email: str) -> None:
+        await self.check(
+            db, request, "login", email,
+            self.settings.login_rate_limit_per_ip,
+            self.settings.login_rate_limit_per_email
+        )
+
+    async def check_register(self, db: AsyncIOMotorClient, request: Request, email: str) -> None:
+        await self.check(
+            db, request, "register", email,
+            self.settings.register_rate_limit_per_ip,
+            self.settings.register_rate_limit_per_email
+        )
+
+
+auth_rate_limiter = AuthRateLimiter()
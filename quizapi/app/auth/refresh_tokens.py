@@ -0,0 +1,72 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .jwt_handler import jwt_handler
+
+
+class RefreshTokenStore:
+    """Tracks refresh-token families in the refresh_token_families collection.
+
+    Every login starts a family. Each refresh atomically swaps the family's
+    current jti for a new one, so presenting an already-rotated token means
+    it was replayed; the whole family is then revoked.
+    """
+
+    async def issue(self, db: AsyncIOMotorClient, user_id: str) -> str:
+        """Start a new family and return its first refresh token"""
+        family = uuid.uuid4().hex
+        jti = uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        await db.refresh_token_families.insert_one({
+            "_id": family,
+            "user_id": user_id,
+            "current_jti": jti,
+            "revoked": False,
+            "created_at": now,
+            "expires_at": now + timedelta(days=jwt_handler.refresh_token_expire_days)
+        })
+        return jwt_handler.create_refresh_token({"sub": user_id, "fam": family}, jti=jti)
+
+    async def rotate(self, db: AsyncIOMotorClient, payload: Dict[str, Any]) -> Optional[str]:
+        """Swap a valid refresh token for the next one in its family, or None if reused/revoked"""
+        family = payload.get("fam")
+        jti = payload.get("jti")
+        if not family or not jti:
+            return None
+
+        new_jti = uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        rotated = await db.refresh_token_families.find_one_and_update(
+            {"_id": family, "current_jti": jti, "revoked": False},
+            {"$set": {
+                "current_jti": new_jti,
+                "rotated_at": now,
+                "expires_at": now + timedelta(days=jwt_handler.refresh_token_expire_days)
+            }},
+            projection={"user_id": 1}
+        )
+        if rotated is None:
+            # Either the family is gone or an older token was replayed: shut the family down
+            await self.revoke_family(db, family)
+            return None
+
+        return jwt_handler.create_refresh_token({"sub": rotated["user_id"], "fam": family}, jti=new_jti)
+
+    async def revoke_family(self, db: AsyncIOMotorClient, family: str) -> None:
+        await db.refresh_token_families.update_one(
+            {"_id": family},
+            {"$set": {"revoked": True, "revoked_at": datetime.now(timezone.utc)}}
+        )
+
+    async def revoke_user_families(self, db: AsyncIOMotorClient, user_id: str) -> None:
+        """Revoke every refresh-token family of a user, so no session can mint new access tokens"""
+        await db.refresh_token_families.update_many(
+            {"user_id": user_id, "revoked": False},
+            {"$set": {"revoked": True, "revoked_at": datetime.now(timezone.utc)}}
+        )
+
+
+refresh_tokens = RefreshTokenStore()
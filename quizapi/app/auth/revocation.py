@@ -0,0 +1,153 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from ..utils.bloom import BloomFilter
+from ..utils.cache import TTLCache
+from ..utils.config import get_settings
+from ..utils.periodic import PeriodicTask
+
+# Refreshes re-read this far back to tolerate clock skew between workers
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def _utc(moment: datetime) -> datetime:
+    # Mongo returns naive UTC datetimes
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+class RevocationStore:
+    """Revoked token ids persisted in the revoked_tokens collection.
+
+    Each worker keeps a Bloom filter of every live revoked jti plus a small
+    cache of confirmed revocations, so the common "not revoked" answer is
+    decided in memory. Only Bloom hits that are not already cached go to Mongo;
+    false positives found that way are cached for
+    revocation_negative_cache_seconds, or until the jti is seen revoked.
+    Documents expire with the token through a TTL index on expires_at.
+
+    Refreshes overlap the previous window, so jtis revoked within it are
+    remembered and added to the filter once, keeping its count honest.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.bloom = self._new_bloom(0)
+        self.revoked = TTLCache(maxsize=self.settings.revocation_cache_size)
+        self.not_revoked = TTLCache(
+            maxsize=self.settings.revocation_cache_size,
+            ttl=self.settings.revocation_negative_cache_seconds
+        )
+        self.recent: Dict[str, datetime] = {}  # jtis already in the filter that a refresh may read again
+        self.last_seen: Optional[datetime] = None
+        self.last_rebuild = 0.0
+        self._refresher: Optional[PeriodicTask] = None
+
+    def _new_bloom(self, live_count: int) -> BloomFilter:
+        capacity = max(self.settings.revocation_bloom_capacity, live_count * 2)
+        return BloomFilter(capacity, self.settings.revocation_bloom_error_rate)
+
+    async def revoke(self, db: AsyncIOMotorClient, jti: str, expires_at: float) -> None:
+        """Persist a revoked jti until the token would have expired anyway"""
+        now = datetime.now(timezone.utc)
+        await db.revoked_tokens.update_one(
+            {"_id": jti},
+            {"$set": {
+                "expires_at": datetime.fromtimestamp(expires_at, timezone.utc),
+                "revoked_at": now
+            }},
+            upsert=True
+        )
+        self._add(jti, now)
+        self.revoked.set(jti, True, expires_at=expires_at)
+
+    def _add(self, jti: str, revoked_at: datetime) -> None:
+        if jti not in self.recent:
+            self.bloom.add(jti)
+            self.recent[jti] = _utc(revoked_at)
+        self.not_revoked.pop(jti)
+
+    async def is_revoked(self, db: AsyncIOMotorClient, jti: str) -> bool:
+        if jti not in self.bloom:
+            return False
+        if self.revoked.get(jti):
+            return True
+        if self.not_revoked.get(jti):
+            return False
+
+        doc = await db.revoked_tokens.find_one({"_id": jti}, {"expires_at": 1})
+        if doc is None:
+            # A false positive; repeated checks of this token stay in memory
+            self.not_revoked.set(jti, True)
+            return False
+
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        self.revoked.set(jti, True, expires_at=expires_at.timestamp())
+        return True
+
+    async def refresh(self, db: AsyncIOMotorClient) -> None:
+        """Add revocations made by other workers since the last refresh"""
+        if self.last_seen is None or time.time() - self.last_rebuild >= self.settings.revocation_rebuild_seconds:
+            await self.rebuild(db)
+            return
+
+        since = self.last_seen - REFRESH_OVERLAP
+        cursor = db.revoked_tokens.find({"revoked_at": {"$gte": since}}, {"revoked_at": 1})
+        async for doc in cursor:
+            self._add(doc["_id"], doc["revoked_at"])
+            self._advance(doc["revoked_at"])
+
+        # Older jtis fall outside every later window
+        cutoff = self.last_seen - REFRESH_OVERLAP
+        self.recent = {jti: revoked_at for jti, revoked_at in self.recent.items() if revoked_at >= cutoff}
+
+        if len(self.bloom) > self.bloom.capacity:
+            await self.rebuild(db)
+
+    async def rebuild(self, db: AsyncIOMotorClient) -> None:
+        """Rebuild the Bloom filter from live revocations, dropping expired ones"""
+        now = datetime.now(timezone.utc)
+        live_count = await db.revoked_tokens.count_documents({"expires_at": {"$gt": now}})
+        bloom = self._new_bloom(live_count)
+
+        recent: Dict[str, datetime] = {}
+        cursor = db.revoked_tokens.find({"expires_at": {"$gt": now}}, {"revoked_at": 1})
+        async for doc in cursor:
+            bloom.add(doc["_id"])
+            self._advance(doc["revoked_at"])
+            revoked_at = _utc(doc["revoked_at"])
+            if revoked_at >= self.last_seen - REFRESH_OVERLAP:
+                recent[doc["_id"]] = revoked_at
+
+        self.bloom = bloom
+        self.last_seen = self.last_seen or now
+        cutoff = self.last_seen - REFRESH_OVERLAP
+        self.recent = {jti: revoked_at for jti, revoked_at in recent.items() if revoked_at >= cutoff}
+        self.not_revoked.clear()
+        self.last_rebuild = time.time()
+
+    def _advance(self, revoked_at: datetime) -> None:
+        revoked_at = _utc(revoked_at)
+        if self.last_seen is None or revoked_at > self.last_seen:
+            self.last_seen = revoked_at
+
+    def start(self, db: AsyncIOMotorClient) -> None:
+        """Start the background refresher for this worker"""
+        if self._refresher is None:
+            self._refresher = PeriodicTask(
+                "Token revocation refresh",
+                self.settings.revocation_refresh_seconds,
+                lambda: self.refresh(db)
+            )
+        self._refresher.start()
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            await self._refresher.stop()
+
+
+revocation_store = RevocationStore()
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from ..utils.config import get_settings
+from ..utils.periodic import PeriodicTask
+
+
+class TokenEpochMap:
+    """Per-worker map of user id -> current token epoch for recently bumped users.
+
+    Access tokens carry the user's token_epoch; bumping it revokes every token
+    issued before. Only bumps younger than the access token lifetime can
+    affect a live token, so the map stays small.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.epochs: Dict[str, int] = {}
+        self._refresher: Optional[PeriodicTask] = None
+
+    def is_current(self, user_id: str, token_epoch: int) -> bool:
+        return token_epoch >= self.epochs.get(user_id, 0)
+
+    async def bump(self, db: AsyncIOMotorClient, user_id: str) -> None:
+        """Invalidate every access token issued to the user so far"""
+        updated = await db.users.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {
+                "$inc": {"token_epoch": 1},
+                "$set": {"epoch_bumped_at": datetime.now(timezone.utc)}
+            },
+            projection={"token_epoch": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is not None:
+            self.epochs[user_id] = updated["token_epoch"]
+
+    async def refresh(self, db: AsyncIOMotorClient) -> None:
+        since = datetime.now(timezone.utc) - timedelta(minutes=self.settings.access_token_expire_minutes)
+        cursor = db.users.find({"epoch_bumped_at": {"$gte": since}}, {"token_epoch": 1})
+        epochs = {}
+        async for doc in cursor:
+            epochs[str(doc["_id"])] = doc.get("token_epoch", 0)
+        self.epochs = epochs
+
+    def start(self, db: AsyncIOMotorClient) -> None:
+        if self._refresher is None:
+            self._refresher = PeriodicTask(
+                "Token epoch refresh",
+                self.settings.token_epoch_refresh_seconds,
+                lambda: self.refresh(db)
+            )
+        self._refresher.start()
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            await self._refresher.stop()
+
+
+token_epochs = TokenEpochMap()
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from ..schemas.user import User
+from ..utils.cache import TTLCache
+from ..utils.config import get_settings
+from ..utils.periodic import PeriodicTask
+
+
+class UserCache:
+    """Per-worker cache of authenticated users keyed by user id.
+
+    Writers call invalidate(), which evicts locally and records a signal in
+    the user_invalidations collection. Every worker polls that collection,
+    so a change made elsewhere is seen within user_invalidation_poll_seconds
+    and never later than user_cache_ttl_seconds.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.users = TTLCache(
+            maxsize=self.settings.user_cache_size,
+            ttl=self.settings.user_cache_ttl_seconds
+        )
+        self.last_seen: Optional[datetime] = None
+        self._poller: Optional[PeriodicTask] = None
+
+    def get(self, user_id: str) -> Optional[User]:
+        return self.users.get(user_id)
+
+    def set(self, user: User) -> None:
+        self.users.set(user.id, user)
+
+    def evict(self, user_id: str) -> None:
+        self.users.pop(user_id)
+
+    async def invalidate(self, db: AsyncIOMotorClient, user_id: str) -> None:
+        """Evict a user on this worker and signal every other worker to do the same"""
+        self.evict(user_id)
+        await db.user_invalidations.insert_one({
+            "user_id": user_id,
+            "invalidated_at": datetime.now(timezone.utc)
+        })
+
+    async def poll(self, db: AsyncIOMotorClient) -> None:
+        """Apply invalidations recorded by other workers since the last poll"""
+        now = datetime.now(timezone.utc)
+        if self.last_seen is None:
+            # Entries cached before startup are bounded by the ttl instead
+            since = now - timedelta(seconds=self.settings.user_cache_ttl_seconds)
+        else:
+            # Overlap the window a little to tolerate clock skew between workers
+            since = self.last_seen - timedelta(seconds=5)
+
+        cursor = db.user_invalidations.find({"invalidated_at": {"$gte": since}})
+        async for doc in cursor:
+            self.evict(doc["user_id"])
+        self.last_seen = now
+
+    def start(self, db: AsyncIOMotorClient) -> None:
+        if self._poller is None:
+            self._poller = PeriodicTask(
+                "User cache invalidation poll",
+                self.settings.user_invalidation_poll_seconds,
+                lambda: self.poll(db)
+            )
+        self._poller.start()
+
+    async def stop(self) -> None:
+        if self._poller is not None:
+            await self._poller.stop()
+
+
+user_cache = UserCache()
@@ -0,0 +1,276 @@
+"""Declarative index registry, reconciled against the database at startup.
+
+Startup only creates missing indexes and adjusts TTLs in place. Changes
+that drop an index (rebuilding one whose options changed, removing one
+missing from the registry) are reported as pending and left to the CLI,
+run from the quizapi directory:
+
+    python -m app.db.indexes                            # report pending changes
+    python -m app.db.indexes --apply                    # rebuild changed indexes
+    python -m app.db.indexes --apply --drop-unlisted    # and drop unlisted ones
+    python -m app.db.indexes --check                    # explain every query shape
+
+--check exits non-zero if any query shape scans a collection or sorts in memory.
+"""
+import argparse
+import asyncio
+import sys
+from typing import Any, Awaitable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from .connection import close_mongo_connection, connect_to_mongo, db_manager
+from .query_shapes import check_query_shapes
+from ..utils.config import get_settings
+
+# Every index the application relies on, by collection. Names are pymongo's
+# defaults, so an index is identified by its keys; reconcile() brings the
+# database in line with this list.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel("email", unique=True),
+        IndexModel("registration_date"),
+        IndexModel([("is_active", ASCENDING), ("registration_date", DESCENDING)]),
+        IndexModel("epoch_bumped_at", sparse=True),
+    ],
+    "attempts": [
+        # A user's attempts newest first: keyset history pages, recent attempts, timelines
+        IndexModel([("user_id", ASCENDING), ("completed_at", DESCENDING), ("_id", DESCENDING)]),
+        # Distinct quizzes a user completed
+        IndexModel([("user_id", ASCENDING), ("quiz_id", ASCENDING)]),
+        # Rescoring walks every attempt of one quiz
+        IndexModel("quiz_id"),
+    ],
+    "quizzes": [
+        # Catalog listing filters by difficulty and pages on _id
+        IndexModel([("difficulty", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "questions": [
+        # Not unique: removing a question shifts later positions one document at a time
+        IndexModel([("quiz_id", ASCENDING), ("position", ASCENDING)]),
+    ],
+    "user_daily_stats": [
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)]),
+    ],
+    "leaderboard_entries": [
+        # Top of a quiz's leaderboard, and counting who ranks ahead of a user
+        IndexModel([
+            ("quiz_id", ASCENDING), ("score", DESCENDING), ("time_key", ASCENDING),
+            ("completed_at", ASCENDING), ("user_id", ASCENDING)
+        ]),
+    ],
+    "revoked_tokens": [
+        IndexModel("expires_at", expireAfterSeconds=0),
+        IndexModel("revoked_at"),
+    ],
+    "user_invalidations": [
+        IndexModel("invalidated_at", expireAfterSeconds=3600),
+    ],
+    "quiz_invalidations": [
+        IndexModel("invalidated_at", expireAfterSeconds=3600),
+    ],
+    "rate_limits": [
+        IndexModel("expires_at", expireAfterSeconds=0),
+    ],
+    "refresh_token_families": [
+        IndexModel("expires_at", expireAfterSeconds=0),
+        IndexModel("user_id"),
+    ],
+    "idempotency_keys": [
+        IndexModel("created_at", expireAfterSeconds=get_settings().idempotency_key_ttl_seconds),
+    ],
+}
+
+# IndexNotFound, IndexOptionsConflict and IndexKeySpecsConflict: another worker,
+# possibly one running an older registry, reconciled the same index meanwhile
+RACE_CODES = {27, 85, 86}
+
+# Options that make two indexes on the same keys different
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _keys(spec: Dict[str, Any]) -> List[Any]:
+    # Indexes created from the shell report 1.0 rather than 1
+    return [(field, int(order) if isinstance(order, float) else order) for field, order in spec["key"].items()]
+
+
+def _options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    # expireAfterSeconds=0 is a real TTL, so only missing values and unique/sparse=False are left out
+    return {option: spec[option] for option in COMPARED_OPTIONS if spec.get(option) is not None and spec[option] is not False}
+
+
+def _only_ttl_differs(current: Dict[str, Any], target: Dict[str, Any]) -> bool:
+    if "expireAfterSeconds" not in current or "expireAfterSeconds" not in target:
+        return False
+    return {**current, "expireAfterSeconds": None} == {**target, "expireAfterSeconds": None}
+
+
+async def _tolerating_races(operation: Awaitable[Any], description: str) -> bool:
+    """Run operation; False if it lost a race with another worker, which is logged and skipped"""
+    try:
+        await operation
+        return True
+    except OperationFailure as e:
+        if e.code not in RACE_CODES:
+            raise
+        print(f"Skipped {description}: {e}")
+        return False
+
+
+async def reconcile_collection(
+    db: AsyncIOMotorClient,
+    name: str,
+    models: List[IndexModel],
+    apply: bool = False,
+    drop_unlisted: bool = False
+) -> Dict[str, List[str]]:
+    """Create missing indexes and fix TTLs; with apply, also rebuild or drop the ones that differ from models"""
+    collection = db[name]
+    existing = {index["name"]: index async for index in collection.list_indexes()}
+    wanted = {model.document["name"]: model for model in models}
+    changes: Dict[str, List[str]] = {"created": [], "updated": [], "dropped": [], "pending": []}
+
+    # New indexes are built before old ones are dropped, so queries are never left without one
+    for index_name, model in wanted.items():
+        if index_name not in existing:
+            if await _tolerating_races(collection.create_indexes([model]), f"creating {name}.{index_name}"):
+                changes["created"].append(index_name)
+
+    for index_name, index in existing.items():
+        if index_name == "_id_":
+            continue
+        model = wanted.get(index_name)
+        if model is None:
+            if not (apply and drop_unlisted):
+                changes["pending"].append(f"{index_name}: not in the registry, dropped by --apply --drop-unlisted")
+            elif await _tolerating_races(collection.drop_index(index_name), f"dropping {name}.{index_name}"):
+                changes["dropped"].append(index_name)
+            continue
+
+        spec = model.document
+        current, target = _options(index), _options(spec)
+        same_keys = _keys(index) == _keys(spec)
+        if same_keys and current == target:
+            continue
+        if same_keys and _only_ttl_differs(current, target):
+            # Only the TTL changed, which collMod adjusts in place
+            command = db.command({"collMod": name, "index": {"name": index_name, "expireAfterSeconds": spec["expireAfterSeconds"]}})
+            if await _tolerating_races(command, f"updating the TTL of {name}.{index_name}"):
+                changes["updated"].append(index_name)
+        elif not apply:
+            changes["pending"].append(f"{index_name}: differs from the registry, rebuilt by --apply")
+        elif await _tolerating_races(collection.drop_index(index_name), f"dropping {name}.{index_name}"):
+            await collection.create_indexes([model])
+            changes["updated"].append(index_name)
+
+    return changes
+
+
+async def reconcile(db: AsyncIOMotorClient, apply: bool = False, drop_unlisted: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """Bring every collection's indexes in line with INDEXES as far as allowed; returns what changed per collection"""
+    report = {}
+    for name, models in INDEXES.items():
+        changes = await reconcile_collection(db, name, models, apply, drop_unlisted)
+        if any(changes.values()):
+            print(f"Indexes on {name}: {changes}")
+            report[name] = changes
+    return report
+
+
+class QueryShapeError(RuntimeError):
+    """Raised in debug mode when a query shape would scan a collection or sort in memory"""
+
+
+class IndexManager:
+    """Reconciles indexes in the background so startup does not wait on index builds.
+
+    Only non-destructive changes are made here; see the module docstring.
+    In debug mode the lifespan awaits run() instead, and query shapes that
+    would scan the collection or sort in memory fail startup with
+    QueryShapeError.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.state = "stopped"
+        self.changes: Dict[str, Dict[str, List[str]]] = {}
+        self.error: Optional[str] = None
+        self.query_problems: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self, db: AsyncIOMotorClient) -> None:
+        self.state = "reconciling"
+        try:
+            self.changes = await reconcile(db)
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            print(f"Index reconciliation failed: {e}")
+            return
+        self.state = "ready"
+
+        if self.settings.debug:
+            self.query_problems = await check_query_shapes(db)
+            if self.query_problems:
+                raise QueryShapeError("Query shape check failed:\n" + "\n".join(self.query_problems))
+
+    def start(self, db: AsyncIOMotorClient) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(db))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "changes": self.changes,
+            "error": self.error,
+            "query_problems": self.query_problems
+        }
+
+
+index_manager = IndexManager()
+
+
+async def run_cli(check: bool, apply: bool, drop_unlisted: bool) -> int:
+    await connect_to_mongo()
+    try:
+        report = await reconcile(db_manager.db, apply, drop_unlisted)
+        pending = sum(len(changes["pending"]) for changes in report.values())
+        if pending:
+            print(f"{pending} index changes pending")
+        if not check:
+            return 0
+        problems = await check_query_shapes(db_manager.db)
+        for problem in problems:
+            print(f"FAIL {problem}")
+        print(f"{len(problems)} query shape problems")
+        return 1 if problems else 0
+    finally:
+        await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconcile indexes with the registry")
+    parser.add_argument("--check", action="store_true", help="Explain every query shape afterwards")
+    parser.add_argument("--apply", action="store_true", help="Rebuild indexes whose keys or options changed")
+    parser.add_argument(
+        "--drop-unlisted",
+        action="store_true",
+        default=get_settings().index_drop_unlisted,
+        help="With --apply, drop indexes missing from the registry"
+    )
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run_cli(args.check, args.apply, args.drop_unlisted)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,120 @@
+import asyncio
+import logging
+
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime,timezone
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from bson import ObjectId
-import bcrypt
+from ..auth.password_hasher import password_hasher
+from ..utils.config import get_settings
+from ..services.leaderboards import leaderboards
+from ..services.user_stats import rebuild_daily_stats
 
-async def create_user_indexes(db: AsyncIOMotorClient):  # Create indexes for the users collection to improve query performance
-    await db.users.create_index("email", unique=True)
-    await db.users.create_index("registration_date")
-    await db.users.create_index("is_active")
-    await db.users.create_index([("is_active", 1), ("registration_date", -1)])
-    print("User collection indexes created successfully")
+logger = logging.getLogger(__name__)
 
+# Passes over users whose stats change between aggregating and writing before giving up on them
+BACKFILL_RETRIES = 5
 
-async def create_attempt_indexes(db: AsyncIOMotorClient):  # Create indexes for the attempts collection
-    await db.attempts.create_index("user_id")
-    await db.attempts.create_index("quiz_id")
-    await db.attempts.create_index("attempt_date")
-    await db.attempts.create_index([("user_id", 1), ("attempt_date", -1)])
-    print("Attempt collection indexes created successfully")
+async def update_user_stats(db: AsyncIOMotorClient, user_id: str):  # Recompute a user's attempt counters from the attempts collection
+    await backfill_user_stats(db, user_ids=[user_id])
 
 
-async def update_user_stats(db: AsyncIOMotorClient, user_id: str):  # Update user statistics after a new attempt
-    attempts = await db.attempts.find({"user_id": user_id}).to_list(1000)
-    if not attempts:
-        return
-    total_attempts = len(attempts)
-    total_score = sum(attempt["score"] for attempt in attempts)
-    average_score = total_score / total_attempts if total_attempts > 0 else 0.0
-    attempt_ids = [str(attempt["_id"]) for attempt in attempts]
-    await db.users.update_one(
-        {"_id": ObjectId(user_id)},
-        {
-            "$set": {
-                "total_attempts": total_attempts,
-                "average_score": round(average_score, 2),
-                "quiz_attempts": attempt_ids
-            }
-        }
+async def backfill_user_stats(db: AsyncIOMotorClient, user_ids: Optional[List[str]] = None, only_missing: bool = False, batch_size: int = 500):
+    """Reconcile total_attempts, score_sum and average_score with the attempts collection.
+
+    Safe while submissions are live: each user's totals are written only if
+    their version is still the one read before aggregating, and users whose
+    stats changed meanwhile are aggregated again.
+    """
+    if user_ids is None:
+        query = {"score_sum": {"$exists": False}} if only_missing else {}
+        user_ids = [str(doc["_id"]) async for doc in db.users.find(query, {"_id": 1})]
+
+    for start in range(0, len(user_ids), batch_size):
+        pending = user_ids[start:start + batch_size]
+        for _ in range(BACKFILL_RETRIES):
+            pending = await _backfill_batch(db, pending)
+            if not pending:
+                break
+        else:
+            logger.warning("Attempt statistics of %d users kept changing during reconciliation: %s", len(pending), ", ".join(pending))
+
+    logger.info("Reconciled attempt statistics for %d users", len(user_ids))
+
+async def _backfill_batch(db: AsyncIOMotorClient, user_ids: List[str]) -> List[str]:  # Returns the users whose version moved before their totals were written
+    versions = {
+        str(doc["_id"]): doc.get("version")
+        async for doc in db.users.find({"_id": {"$in": [ObjectId(user_id) for user_id in user_ids]}}, {"version": 1})
+    }
+    if not versions:
+        return []
+
+    pipeline = [
+        {"$match": {"user_id": {"$in": list(versions)}}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}, "score_sum": {"$sum": "$score"}}}
+    ]
+    totals = {doc["_id"]: doc async for doc in db.attempts.aggregate(pipeline)}
+
+    async def write(user_id: str, version: Optional[int]) -> bool:
+        total = totals.get(user_id, {"count": 0, "score_sum": 0.0})
+        average_score = total["score_sum"] / total["count"] if total["count"] > 0 else 0.0
+        result = await db.users.update_one(
+            # Submissions bump version with their own $add, so a match means none landed since the read
+            {"_id": ObjectId(user_id), "version": version if version is not None else {"$exists": False}},
+            {"$set": {
+                "total_attempts": total["count"],
+                "score_sum": total["score_sum"],
+                "average_score": round(average_score, 2)
+            }, "$inc": {"version": 1}}
+        )
+        return result.matched_count > 0
+
+    # One write per user, so each result tells whether that user's version still matched
+    written = await asyncio.gather(*(write(user_id, version) for user_id, version in versions.items()))
+    return [user_id for user_id, ok in zip(versions, written) if not ok]
+
+async def trim_recent_attempts(db: AsyncIOMotorClient):  # Cap embedded quiz_attempts arrays written before they were bounded
+    limit = get_settings().recent_attempts_limit
+    result = await db.users.update_many(
+        {f"quiz_attempts.{limit}": {"$exists": True}},
+        [{"$set": {
+            "quiz_attempts": {"$slice": ["$quiz_attempts", -limit]},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+        }}]
+    )
+    print(f"Trimmed embedded attempt history for {result.modified_count} users")
+
+async def backfill_question_counts(db: AsyncIOMotorClient):  # Quizzes written before question_count was stored
+    result = await db.quizzes.update_many(
+        {"question_count": {"$exists": False}},
+        [{"$set": {"question_count": {"$size": {"$ifNull": ["$questions", []]}}}}]
     )
+    print(f"Backfilled question counts for {result.modified_count} quizzes")
+
+async def backfill_daily_stats(db: AsyncIOMotorClient):  # Build the dashboard rollup once for attempts stored before it existed
+    if await db.user_daily_stats.estimated_document_count() > 0:
+        return
+    if await db.attempts.estimated_document_count() == 0:
+        return
+    await rebuild_daily_stats(db)
+    print("Built user daily stats from existing attempts")
+
+async def repair_attempt_stats(db: AsyncIOMotorClient) -> Dict[str, int]:  # Recompute aggregates that missed attempts, as recorded by record_stored_attempts
+    repairs = await db.stats_repairs.find({}).to_list(None)
+    if not repairs:
+        return {"users": 0, "quizzes": 0}
+
+    user_ids = sorted({user_id for repair in repairs for user_id in repair.get("user_ids", [])})
+    quiz_ids = sorted({quiz_id for repair in repairs for quiz_id in repair.get("quiz_ids", [])})
+    await backfill_user_stats(db, user_ids=user_ids)
+    await rebuild_daily_stats(db, user_ids=user_ids)
+    for quiz_id in quiz_ids:
+        await leaderboards.rebuild(db, quiz_id)
+
+    # Only the repairs read above; failures recorded meanwhile wait for the next run
+    await db.stats_repairs.delete_many({"_id": {"$in": [repair["_id"] for repair in repairs]}})
+    logger.info("Repaired attempt statistics for %d users and %d quizzes", len(user_ids), len(quiz_ids))
+    return {"users": len(user_ids), "quizzes": len(quiz_ids)}
 
 async def migrate_existing_users(db: AsyncIOMotorClient): # Migrate existing users to the new schema (adding missing fields with default values)
     users = await db.users.find({}).to_list(1000)
@@ -56,6 +133,8 @@ async def migrate_existing_users(db: AsyncIOMotorClient): # Migrate existing use
             updates["quiz_attempts"] = []
         if "average_score" not in user:
             updates["average_score"] = 0.0
+        if "token_epoch" not in user:
+            updates["token_epoch"] = 0
 
         if updates:
             await db.users.update_one(
@@ -70,7 +149,7 @@ async def create_admin_user(db: AsyncIOMotorClient, email: str, password: str, f
     if existing_admin:
         print(f"Admin user with email {email} already exists")
         return
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_password = await password_hasher.hash(password)
     admin_user = {
         "email": email,
         "full_name": full_name,
@@ -80,14 +159,19 @@ async def create_admin_user(db: AsyncIOMotorClient, email: str, password: str, f
         "registration_date": datetime.now(timezone.utc),
         "total_attempts": 0,
         "quiz_attempts": [],
-        "average_score": 0.0
+        "average_score": 0.0,
+        "score_sum": 0.0,
+        "token_epoch": 0
     }
     result = await db.users.insert_one(admin_user)
     print(f"Admin user created with ID: {result.inserted_id}")
 
-async def initialize_database(db: AsyncIOMotorClient):
+async def initialize_database(db: AsyncIOMotorClient):  # Indexes are reconciled separately, see indexes.py
     print("Initializing database...")
-    await create_user_indexes(db)
-    await create_attempt_indexes(db)
     await migrate_existing_users(db)
+    await backfill_user_stats(db, only_missing=True)
+    await trim_recent_attempts(db)
+    await backfill_question_counts(db)
+    await backfill_daily_stats(db)
+    await repair_attempt_stats(db)
     print("Database initialization completed!")
@@ -0,0 +1,73 @@
+"""Move quiz questions between the embedded and the questions-collection layout.
+
+Run from the quizapi directory:
+
+    python -m app.db.migrate_questions --to collection --min-questions 500
+    python -m app.db.migrate_questions --to embedded --quiz <quiz_id>
+
+Each quiz is switched with a version-guarded update, so a quiz edited while
+it is being migrated is skipped and can simply be migrated again. Running
+workers drop their cached copy through the usual quiz invalidation signal.
+"""
+import argparse
+import asyncio
+from typing import List, Optional
+
+from bson import ObjectId
+
+from .connection import close_mongo_connection, connect_to_mongo, db_manager
+from .init_db import backfill_question_counts
+from ..services.question_store import COLLECTION, EMBEDDED, migrate_quiz
+from ..services.quiz_cache import quiz_cache
+
+
+async def migrate(layout: str, min_questions: int = 0, quiz_ids: Optional[List[str]] = None, dry_run: bool = False) -> None:
+    await connect_to_mongo()
+    db = db_manager.db
+    try:
+        await backfill_question_counts(db)
+        query = {
+            "question_storage": {"$ne": COLLECTION} if layout == COLLECTION else COLLECTION,
+            "question_count": {"$gte": min_questions}
+        }
+        if quiz_ids:
+            query["_id"] = {"$in": [ObjectId(quiz_id) for quiz_id in quiz_ids]}
+
+        candidates = [str(doc["_id"]) async for doc in db.quizzes.find(query, {"_id": 1})]
+        print(f"{len(candidates)} quizzes to move to the {layout} layout")
+        if dry_run:
+            return
+
+        migrated, skipped = 0, []
+        for quiz_id in candidates:
+            try:
+                moved = await migrate_quiz(db, quiz_id, layout)
+            except Exception as e:
+                # e.g. a bank too large to embed again within the 16 MB document limit
+                print(f"Quiz {quiz_id} failed: {e}")
+                moved = False
+            if moved:
+                await quiz_cache.invalidate(db, quiz_id)
+                migrated += 1
+            else:
+                skipped.append(quiz_id)
+
+        print(f"Migrated {migrated} quizzes")
+        if skipped:
+            print(f"Skipped {len(skipped)} quizzes (changed during migration or failed): {', '.join(skipped)}")
+    finally:
+        await close_mongo_connection()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--to", choices=[COLLECTION, EMBEDDED], required=True, help="Target question layout")
+    parser.add_argument("--min-questions", type=int, default=0, help="Only migrate quizzes with at least this many questions")
+    parser.add_argument("--quiz", action="append", dest="quiz_ids", help="Only migrate this quiz (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how many quizzes would move")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.to, args.min_questions, args.quiz_ids, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
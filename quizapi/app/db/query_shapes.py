@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Plan stages that mean a query reads the whole collection or sorts its results in memory
+PROBLEM_STAGES = {"COLLSCAN": "collection scan", "SORT": "in-memory sort"}
+
+# Parts of explain output that echo the query rather than describe the chosen plan
+SKIPPED_KEYS = {"rejectedPlans", "command", "parsedQuery", "serverInfo"}
+
+
+class QueryShape(NamedTuple):
+    name: str
+    command: Dict[str, Any]  # find/aggregate/distinct/count command, with placeholder values
+
+
+_user_id = str(ObjectId())
+_quiz_id = str(ObjectId())
+_now = datetime.now(timezone.utc)
+
+# The queries routes and services issue against large or growing collections.
+# Lookups by _id are left out; they always use the _id index.
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("login by email", {"find": "users", "filter": {"email": "user@example.com"}, "limit": 1}),
+    QueryShape("token epoch refresh", {"find": "users", "filter": {"epoch_bumped_at": {"$gte": _now}}}),
+    QueryShape("admin active users", {"count": "users", "query": {"is_active": True}}),
+    QueryShape("attempt history page", {
+        "find": "attempts",
+        "filter": {"user_id": _user_id, "completed_at": {"$lte": _now}, "$or": [
+            {"completed_at": {"$lt": _now}},
+            {"completed_at": _now, "_id": {"$lt": ObjectId()}}
+        ]},
+        "sort": {"completed_at": -1, "_id": -1},
+        "limit": 21
+    }),
+    QueryShape("recent attempts", {
+        "find": "attempts", "filter": {"user_id": _user_id}, "sort": {"completed_at": -1}, "limit": 10,
+        "projection": {"answers": 0}
+    }),
+    QueryShape("timeline attempts", {
+        "find": "attempts", "filter": {"user_id": _user_id}, "sort": {"completed_at": 1},
+        "projection": {"_id": 0, "completed_at": 1, "score": 1, "quiz_title": 1}
+    }),
+    QueryShape("user attempt count", {"count": "attempts", "query": {"user_id": _user_id}}),
+    QueryShape("completed quizzes", {"distinct": "attempts", "key": "quiz_id", "query": {"user_id": _user_id}}),
+    QueryShape("rescore quiz attempts", {
+        "find": "attempts", "filter": {"quiz_id": _quiz_id, "question_layout": {"$in": [0, None]}}
+    }),
+    QueryShape("remap removed questions", {
+        "find": "attempts", "filter": {"quiz_id": _quiz_id, "question_layout": {"$not": {"$gte": 2}}}
+    }),
+    QueryShape("quiz catalog page", {
+        "aggregate": "quizzes",
+        "pipeline": [
+            {"$match": {"difficulty": "easy", "_id": {"$gt": ObjectId()}}},
+            {"$sort": {"_id": 1}},
+            {"$limit": 21}
+        ],
+        "cursor": {}
+    }),
+    QueryShape("question page", {
+        "find": "questions",
+        "filter": {"quiz_id": _quiz_id, "question_set": str(ObjectId()), "position": {"$gte": 0, "$lt": 50}},
+        "sort": {"position": 1}
+    }),
+    QueryShape("attach questions", {
+        "find": "questions", "filter": {"quiz_id": {"$in": [_quiz_id]}}, "sort": {"quiz_id": 1, "position": 1}
+    }),
+    QueryShape("daily stats", {"find": "user_daily_stats", "filter": {"user_id": _user_id}, "sort": {"day": 1}}),
+    QueryShape("leaderboard top", {
+        "find": "leaderboard_entries", "filter": {"quiz_id": _quiz_id},
+        "sort": {"score": -1, "time_key": 1, "completed_at": 1, "user_id": 1}, "limit": 100
+    }),
+    QueryShape("leaderboard rank", {"count": "leaderboard_entries", "query": {"quiz_id": _quiz_id, "$or": [
+        {"score": {"$gt": 50.0}},
+        {"score": 50.0, "time_key": {"$lt": 60}},
+        {"score": 50.0, "time_key": 60, "completed_at": {"$lt": _now}},
+        {"score": 50.0, "time_key": 60, "completed_at": _now, "user_id": {"$lt": _user_id}}
+    ]}}),
+    QueryShape("revocations since", {"find": "revoked_tokens", "filter": {"revoked_at": {"$gte": _now}}}),
+    QueryShape("live revocations", {"find": "revoked_tokens", "filter": {"expires_at": {"$gt": _now}}}),
+    QueryShape("user invalidations since", {"find": "user_invalidations", "filter": {"invalidated_at": {"$gte": _now}}}),
+    QueryShape("quiz invalidations since", {"find": "quiz_invalidations", "filter": {"invalidated_at": {"$gte": _now}}}),
+]
+
+
+def plan_stages(explain: Any) -> Iterator[str]:
+    """Yield the name of every stage of the chosen plans"""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key in SKIPPED_KEYS:
+                continue
+            if key == "stage" and isinstance(value, str):
+                yield value
+            elif key == "$sort":
+                # A $sort left in the pipeline was not covered by an index
+                yield "SORT"
+            else:
+                yield from plan_stages(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from plan_stages(item)
+
+
+async def explain_shape(db: AsyncIOMotorClient, shape: QueryShape) -> List[str]:
+    """Problems in the winning plan of one query shape; empty if it is index-backed"""
+    explain = await db.command({"explain": shape.command, "verbosity": "queryPlanner"})
+    return [f"{shape.name}: {PROBLEM_STAGES[stage]}" for stage in plan_stages(explain) if stage in PROBLEM_STAGES]
+
+
+async def check_query_shapes(db: AsyncIOMotorClient) -> List[str]:
+    """Explain every registered query shape and return the problems found"""
+    problems = []
+    for shape in QUERY_SHAPES:
+        try:
+            problems += await explain_shape(db, shape)
+        except Exception as e:
+            problems.append(f"{shape.name}: explain failed: {e}")
+    return problems
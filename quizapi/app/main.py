@@ -2,16 +2,44 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from .db.connection import close_mongo_connection, connect_to_mongo, db_manager
+from .db.indexes import index_manager
 from .db.init_db import initialize_database
-from .routes import quizzes, questions, attempts, admin, auth, users, change_password
+from .auth.revocation import revocation_store
+from .auth.user_cache import user_cache
+from .auth.token_epochs import token_epochs
+from .auth.password_hasher import password_hasher
+from .services.ingestion import attempt_ingestion
+from .services.quiz_cache import quiz_cache
+from .utils.serialization import ORJSONResponse
+from .routes import quizzes, questions, attempts, leaderboards, admin, auth, users, change_password
 import os
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_to_mongo()
     db = db_manager.db
+    if index_manager.settings.debug:
+        # Fail startup on query shapes the indexes do not cover
+        await index_manager.run(db)
+    else:
+        # Index builds run in the background; queries are correct without them, only slower
+        index_manager.start(db)
     await initialize_database(db)
+    await revocation_store.rebuild(db)
+    revocation_store.start(db)
+    user_cache.start(db)
+    quiz_cache.start(db)
+    await token_epochs.refresh(db)
+    token_epochs.start(db)
+    attempt_ingestion.start(db)
     yield
+    await attempt_ingestion.stop()
+    await token_epochs.stop()
+    await quiz_cache.stop()
+    await user_cache.stop()
+    await revocation_store.stop()
+    await index_manager.stop()
+    password_hasher.shutdown()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -19,6 +47,7 @@ app = FastAPI(
     description="A backend application built using FastAPI for managing quizzes, questions, and user attempts.",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 frontend_url = os.environ.get("FRONTEND_URL", "http://localhost:3000")
@@ -36,7 +65,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    expose_headers=["*", "X-Next-Cursor", "X-Next-Offset", "X-Total-Count", "ETag"],
     max_age=86400,
 )
 
@@ -48,6 +77,7 @@ app.include_router(users.router, prefix="/api", tags=["Users"])
 app.include_router(quizzes.router, prefix="/api", tags=["Quizzes"])
 app.include_router(questions.router, prefix="/api", tags=["Questions"])
 app.include_router(attempts.router, prefix="/api", tags=["Attempts"])
+app.include_router(leaderboards.router, prefix="/api", tags=["Leaderboards"])
 app.include_router(admin.router, prefix="/api", tags=["Admin Panel"])
 
 
@@ -1,8 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
 from typing import List, Optional
 from ..schemas import question,quiz,attempt,user
 from ..db.database import get_db
+from ..db.init_db import backfill_user_stats, repair_attempt_stats
+from ..db.indexes import index_manager
 from ..auth.dependencies import get_current_admin_user
+from ..auth.user_cache import user_cache
+from ..auth.refresh_tokens import refresh_tokens
+from ..auth.token_epochs import token_epochs
+from ..auth.password_hasher import password_hasher
+from ..services import question_store
+from ..services.quiz_cache import quiz_cache
+from ..services.scoring import AnswerKey, answer_keys
+from ..utils.config import get_settings
+from ..utils.serialization import (
+    indexed_question_serializer, quiz_serializer, quizzes_serializer, user_serializer, users_serializer
+)
+from ..services.attempt_history import history_response
+from ..services.attempts import remap_removed_questions
+from ..services.leaderboards import leaderboards
+from ..services.rescoring import rescore_jobs
+from ..services.ingestion import attempt_ingestion
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from datetime import datetime
@@ -13,6 +31,7 @@ router = APIRouter(
     dependencies=[Depends(get_current_admin_user)],
     responses={404: {"description": "Not found"}},
 )
+settings = get_settings()
 
 
 # User Management Endpoints
@@ -28,18 +47,10 @@ async def admin_get_all_users(
     if active_only:
         filter_query["is_active"] = True
 
-    users_cursor = db.users.find(filter_query).skip(skip).limit(limit)
+    users_cursor = db.users.find(filter_query, {"hashed_password": 0}).skip(skip).limit(limit)
     users = await users_cursor.to_list(length=limit)
 
-    for user_doc in users:
-        user_doc["_id"] = str(user_doc["_id"])
-        # Convert datetime fields to ISO format if they exist
-        if "registration_date" in user_doc and user_doc["registration_date"]:
-            user_doc["registration_date"] = user_doc["registration_date"].isoformat()
-        if "last_login" in user_doc and user_doc["last_login"]:
-            user_doc["last_login"] = user_doc["last_login"].isoformat()
-
-    return users
+    return users_serializer.response(users)
 
 @router.get("/users/stats", response_model=user.UserStats)
 async def admin_get_user_stats(
@@ -80,17 +91,11 @@ async def admin_get_user(
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="Invalid user ID")
 
-    user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
+    user_doc = await db.users.find_one({"_id": ObjectId(user_id)}, {"hashed_password": 0})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user_doc["_id"] = str(user_doc["_id"])
-    if "registration_date" in user_doc and user_doc["registration_date"]:
-        user_doc["registration_date"] = user_doc["registration_date"].isoformat()
-    if "last_login" in user_doc and user_doc["last_login"]:
-        user_doc["last_login"] = user_doc["last_login"].isoformat()
-
-    return user_doc
+    return user_serializer.response(user_doc)
 
 @router.put("/users/{user_id}/toggle-active", response_model=user.User)
 async def admin_toggle_user_active(
@@ -116,15 +121,18 @@ async def admin_toggle_user_active(
     new_status = not user_doc.get("is_active", True)
     result = await db.users.update_one(
         {"_id": ObjectId(user_id)},
-        {"$set": {"is_active": new_status}}
+        {"$set": {"is_active": new_status}, "$inc": {"version": 1}}
     )
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
-    updated_user = await db.users.find_one({"_id": ObjectId(user_id)})
-    updated_user["_id"] = str(updated_user["_id"])
-    return updated_user
+    await user_cache.invalidate(db, user_id)
+    await token_epochs.bump(db, user_id)
+    await refresh_tokens.revoke_user_families(db, user_id)
+
+    updated_user = await db.users.find_one({"_id": ObjectId(user_id)}, {"hashed_password": 0})
+    return user_serializer.response(updated_user)
 
 @router.put("/users/{user_id}/toggle-admin", response_model=user.User)
 async def admin_toggle_user_admin(
@@ -150,36 +158,37 @@ async def admin_toggle_user_admin(
     new_admin_status = not user_doc.get("is_admin", False)
     result = await db.users.update_one(
         {"_id": ObjectId(user_id)},
-        {"$set": {"is_admin": new_admin_status}}
+        {"$set": {"is_admin": new_admin_status}, "$inc": {"version": 1}}
     )
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
-    updated_user = await db.users.find_one({"_id": ObjectId(user_id)})
-    updated_user["_id"] = str(updated_user["_id"])
-    return updated_user
+    await user_cache.invalidate(db, user_id)
+    await token_epochs.bump(db, user_id)
+
+    updated_user = await db.users.find_one({"_id": ObjectId(user_id)}, {"hashed_password": 0})
+    return user_serializer.response(updated_user)
 
 @router.get("/users/{user_id}/attempts", response_model=List[attempt.Attempt])
 async def admin_get_user_attempts(
     user_id: str,
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=settings.attempt_page_max, description="Number of attempts to return"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json pages, or ndjson to stream the whole history"),
     current_admin: user.User = Depends(get_current_admin_user),
     db: AsyncIOMotorClient = Depends(get_db)
 ):
-    """Get all attempts by a specific user"""
+    """Get a user's attempts newest first, a page at a time or streamed as NDJSON"""
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="Invalid user ID")
 
     # Check if user exists
-    user_exists = await db.users.find_one({"_id": ObjectId(user_id)})
+    user_exists = await db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 1})
     if not user_exists:
         raise HTTPException(status_code=404, detail="User not found")
 
-    attempts = await db.attempts.find({"user_id": user_id}).to_list(1000)
-    for attempt_doc in attempts:
-        attempt_doc["_id"] = str(attempt_doc["_id"])
-
-    return attempts
+    return await history_response(db, user_id, limit, after, format)
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def admin_delete_user(
@@ -200,28 +209,79 @@ async def admin_delete_user(
 
     result = await db.users.update_one(
         {"_id": ObjectId(user_id)},
-        {"$set": {"is_active": False, "deleted_at": datetime.utcnow()}}
+        {"$set": {"is_active": False, "deleted_at": datetime.utcnow()}, "$inc": {"version": 1}}
     )
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
+    await user_cache.invalidate(db, user_id)
+    await token_epochs.bump(db, user_id)
+    await refresh_tokens.revoke_user_families(db, user_id)
+
+@router.post("/maintenance/reconcile-user-stats")
+async def admin_reconcile_user_stats(
+    current_admin: user.User = Depends(get_current_admin_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Recompute every user's attempt counters from the attempts collection"""
+    await backfill_user_stats(db)
+    return {"message": "User statistics reconciled"}
+
+@router.post("/maintenance/repair-attempt-stats")
+async def admin_repair_attempt_stats(
+    current_admin: user.User = Depends(get_current_admin_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Recompute stats, daily rollups and leaderboards of users and quizzes whose updates failed after their attempts were stored"""
+    repaired = await repair_attempt_stats(db)
+    return {"message": "Attempt statistics repaired", **repaired}
+
 # Quiz Management Endpoints
+async def _quiz_changed(db: AsyncIOMotorClient, quiz_id: str, previous_key: Optional[AnswerKey]) -> dict:
+    """Drop cached copies of a changed quiz and rescore its attempts if the answer key moved"""
+    await quiz_cache.invalidate(db, quiz_id)
+    headers = {}
+    new_key = await answer_keys.get(db, quiz_id)
+    if previous_key is not None and new_key is not None and previous_key.masks != new_key.masks:
+        # Existing attempts were scored against the old key; rescore them in the background
+        headers["X-Rescore-Job"] = await rescore_jobs.start(db, quiz_id)
+    return headers
+
+async def _get_quiz_layout(db: AsyncIOMotorClient, quiz_id: str) -> dict:
+    if not ObjectId.is_valid(quiz_id):
+        raise HTTPException(status_code=400, detail="Invalid quiz ID")
+    quiz_doc = await db.quizzes.find_one({"_id": ObjectId(quiz_id)}, {"question_storage": 1, "question_set": 1})
+    if quiz_doc is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    return quiz_doc
+
 @router.post("/quizzes", response_model=quiz.Quiz)
 async def admin_create_quiz(
     quiz_data: quiz.QuizCreate,
     current_admin: user.User = Depends(get_current_admin_user),
     db: AsyncIOMotorClient = Depends(get_db)
 ):
-    """Create a new quiz"""
+    """Create a new quiz, storing its questions in the layout set by question_storage"""
     quiz_dict = quiz_data.model_dump()
+    questions = quiz_dict.pop("questions")
     quiz_dict["created_by"] = current_admin.id
     quiz_dict["created_at"] = datetime.utcnow()
-
-    result = await db.quizzes.insert_one(quiz_dict)
-    quiz_dict["_id"] = str(result.inserted_id)
-
-    return quiz_dict
+    quiz_dict["version"] = 1
+    quiz_dict["question_count"] = len(questions)
+    quiz_dict["question_storage"] = settings.question_storage
+
+    if settings.question_storage == question_store.COLLECTION:
+        # The questions are in place before the quiz that points at them is visible
+        quiz_dict["_id"] = ObjectId()
+        quiz_dict["question_set"] = await question_store.write_question_set(db, str(quiz_dict["_id"]), questions)
+        await db.quizzes.insert_one(quiz_dict)
+    else:
+        quiz_dict["questions"] = questions
+        await db.quizzes.insert_one(quiz_dict)
+
+    quiz_dict["questions"] = questions
+    return quiz_serializer.response(quiz_dict)
 
 @router.get("/quizzes", response_model=List[quiz.Quiz])
 async def admin_get_all_quizzes(
@@ -230,9 +290,8 @@ async def admin_get_all_quizzes(
 ):
     """Get all quizzes for admin"""
     quizzes = await db.quizzes.find().to_list(1000)
-    for quiz_doc in quizzes:
-        quiz_doc["_id"] = str(quiz_doc["_id"])
-    return quizzes
+    await question_store.attach_questions(db, quizzes)
+    return quizzes_serializer.response(quizzes)
 
 @router.put("/quizzes/{quiz_id}", response_model=quiz.Quiz)
 async def admin_update_quiz(
@@ -241,24 +300,29 @@ async def admin_update_quiz(
     current_admin: user.User = Depends(get_current_admin_user),
     db: AsyncIOMotorClient = Depends(get_db)
 ):
-    """Update a quiz"""
-    if not ObjectId.is_valid(quiz_id):
-        raise HTTPException(status_code=400, detail="Invalid quiz ID")
+    """Update a quiz, replacing all of its questions"""
+    quiz_doc = await _get_quiz_layout(db, quiz_id)
 
+    previous_key = await answer_keys.get(db, quiz_id)
     quiz_dict = quiz_data.model_dump()
     quiz_dict["updated_at"] = datetime.utcnow()
-
-    result = await db.quizzes.update_one(
-        {"_id": ObjectId(quiz_id)},
-        {"$set": quiz_dict}
-    )
-
-    if result.matched_count == 0:
+    quiz_dict["question_count"] = len(quiz_dict["questions"])
+
+    quiz_filter = {"_id": ObjectId(quiz_id)}
+    if question_store.uses_collection(quiz_doc):
+        questions = quiz_dict.pop("questions")
+        update = {"$set": quiz_dict, "$inc": {"version": 1}}
+        matched = await question_store.replace_questions(db, quiz_filter, questions, update) is not None
+    else:
+        result = await db.quizzes.update_one(quiz_filter, {"$set": quiz_dict, "$inc": {"version": 1}})
+        matched = result.matched_count > 0
+
+    if not matched:
         raise HTTPException(status_code=404, detail="Quiz not found")
 
-    updated_quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
-    updated_quiz["_id"] = str(updated_quiz["_id"])
-    return updated_quiz
+    headers = await _quiz_changed(db, quiz_id, previous_key)
+    updated_quiz = await question_store.load_quiz(db, quiz_id)
+    return quiz_serializer.response(updated_quiz, headers=headers)
 
 @router.delete("/quizzes/{quiz_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def admin_delete_quiz(
@@ -274,6 +338,101 @@ async def admin_delete_quiz(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Quiz not found")
 
+    await question_store.delete_questions(db, quiz_id)
+    await leaderboards.delete(db, quiz_id)
+    await quiz_cache.invalidate(db, quiz_id)
+
+@router.post("/quizzes/{quiz_id}/questions", response_model=question.IndexedQuestion, status_code=status.HTTP_201_CREATED)
+async def admin_add_question(
+    quiz_id: str,
+    question_data: question.QuestionCreate,
+    current_admin: user.User = Depends(get_current_admin_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Append one question to a quiz; existing attempts are rescored, as for a full update"""
+    quiz_doc = await _get_quiz_layout(db, quiz_id)
+    previous_key = await answer_keys.get(db, quiz_id)
+    question_dict = question_data.model_dump()
+    index = await question_store.add_question(db, quiz_doc, question_dict)
+    headers = await _quiz_changed(db, quiz_id, previous_key)
+    return indexed_question_serializer.response(
+        {**question_dict, "index": index},
+        status_code=status.HTTP_201_CREATED,
+        headers=headers
+    )
+
+@router.put("/quizzes/{quiz_id}/questions/{index}", response_model=question.IndexedQuestion)
+async def admin_update_question(
+    quiz_id: str,
+    index: int,
+    question_data: question.QuestionCreate,
+    current_admin: user.User = Depends(get_current_admin_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Replace one question without rewriting the rest of the quiz"""
+    quiz_doc = await _get_quiz_layout(db, quiz_id)
+    previous_key = await answer_keys.get(db, quiz_id)
+    question_dict = question_data.model_dump()
+    if index < 0 or not await question_store.set_question(db, quiz_doc, index, question_dict):
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    headers = await _quiz_changed(db, quiz_id, previous_key)
+    return indexed_question_serializer.response({**question_dict, "index": index}, headers=headers)
+
+@router.delete("/quizzes/{quiz_id}/questions/{index}", status_code=status.HTTP_204_NO_CONTENT)
+async def admin_delete_question(
+    quiz_id: str,
+    index: int,
+    current_admin: user.User = Depends(get_current_admin_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Remove one question; later questions move up one index.
+
+    Stored answers are remapped to the new indexes before the rescore
+    starts, so every attempt is scored against the questions it answered.
+    """
+    quiz_doc = await _get_quiz_layout(db, quiz_id)
+    previous_key = await answer_keys.get(db, quiz_id)
+    removed = await question_store.remove_question(db, quiz_doc, index) if index >= 0 else None
+    if removed is None:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    # Drop the old answer key before remapping, so submissions stop being scored against it;
+    # the rescore job remaps again for any worker that was still holding it
+    await quiz_cache.invalidate(db, quiz_id)
+    await remap_removed_questions(db, quiz_id, removed)
+
+    headers = await _quiz_changed(db, quiz_id, previous_key)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=headers)
+
+@router.post("/quizzes/{quiz_id}/rescore", status_code=status.HTTP_202_ACCEPTED)
+async def admin_rescore_quiz(
+    quiz_id: str,
+    current_admin: user.User = Depends(get_current_admin_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Rescore every attempt of a quiz against its current answer key"""
+    if not ObjectId.is_valid(quiz_id):
+        raise HTTPException(status_code=400, detail="Invalid quiz ID")
+
+    if await db.quizzes.count_documents({"_id": ObjectId(quiz_id)}, limit=1) == 0:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    job_id = await rescore_jobs.start(db, quiz_id)
+    return {"job_id": job_id}
+
+@router.get("/rescore-jobs/{job_id}")
+async def admin_get_rescore_job(
+    job_id: str,
+    current_admin: user.User = Depends(get_current_admin_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Get progress of a rescoring job"""
+    job = await rescore_jobs.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Rescore job not found")
+    return job
+
 # Dashboard Endpoints
 @router.get("/dashboard")
 async def admin_get_dashboard_stats(
@@ -344,3 +503,31 @@ async def admin_get_dashboard_stats(
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch dashboard stats: {str(e)}")
+
+@router.get("/metrics/password-hashing")
+async def admin_get_password_hashing_metrics(
+    current_admin: user.User = Depends(get_current_admin_user)
+):
+    """Get queue depth and throughput of the password hashing pool"""
+    return password_hasher.stats()
+
+@router.get("/metrics/quiz-cache")
+async def admin_get_quiz_cache_metrics(
+    current_admin: user.User = Depends(get_current_admin_user)
+):
+    """Report this worker's quiz cache size and invalidation mode"""
+    return quiz_cache.stats()
+
+@router.get("/metrics/indexes")
+async def admin_get_index_metrics(
+    current_admin: user.User = Depends(get_current_admin_user)
+):
+    """Report index reconciliation progress and, in debug mode, query shapes without index support"""
+    return index_manager.stats()
+
+@router.get("/metrics/attempt-ingestion")
+async def admin_get_attempt_ingestion_metrics(
+    current_admin: user.User = Depends(get_current_admin_user)
+):
+    """Get queue depth and group-commit statistics of the attempt ingestion queue"""
+    return attempt_ingestion.stats()
@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
 from ..schemas import attempt
 from ..db.database import get_db
 from ..auth.dependencies import get_current_user
+from ..services.scoring import answer_keys
+from ..services.attempt_history import history_response
+from ..services.attempts import build_attempt_doc, record_stored_attempts, write_attempts
+from ..services.ingestion import IngestionQueueFull, attempt_ingestion
+from ..services.idempotency import idempotency_keys
+from ..utils.config import get_settings
+from ..utils.serialization import attempt_serializer
 from motor.motor_asyncio import AsyncIOMotorClient
 
 router = APIRouter()
+settings = get_settings()
 
 @router.post("/quizzes/{quiz_id}/submit", response_model=attempt.Attempt, status_code=201)
 async def submit_quiz_attempt(
     quiz_id: str,
     submission_data: attempt.AttemptCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user = Depends(get_current_user),
     db: AsyncIOMotorClient = Depends(get_db)
 ):
@@ -20,96 +29,109 @@ async def submit_quiz_attempt(
         if not ObjectId.is_valid(quiz_id):
             raise HTTPException(status_code=400, detail="Invalid quiz ID")
 
-        quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
-        if not quiz:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-
-        answers = submission_data.answers
-
-        total_questions = len(quiz["questions"])
-        correct_count = 0
-
-        for answer_data in answers:
-            question_index = answer_data.question_index
-            selected_options = answer_data.selected_options
-
-            if question_index < len(quiz["questions"]):
-                question = quiz["questions"][question_index]
-                correct_options = [i for i, opt in enumerate(question["options"]) if opt["is_correct"]]
-
-                if set(selected_options) == set(correct_options):
-                    correct_count += 1
-
-        score = (correct_count / total_questions * 100) if total_questions > 0 else 0
-
-        attempt_data = {
-            "user_id": current_user.id,
-            "quiz_id": quiz_id,
-            "quiz_title": quiz["title"],
-            "answers": [answer.model_dump() for answer in answers],
-            "score": round(score, 2),
-            "completed_at": datetime.utcnow(),
-            "time_taken": submission_data.time_taken
-        }
-
-        result = await db.attempts.insert_one(attempt_data)
-
-        user = await db.users.find_one({"_id": ObjectId(current_user.id)})
-        if user:
-            user_attempts = await db.attempts.find({"user_id": current_user.id}).to_list(1000)
-            total_attempts = len(user_attempts)
-            total_score = sum(attempt["score"] for attempt in user_attempts)
-            avg_score = total_score / total_attempts if total_attempts > 0 else 0
-
-            attempt_record = {
-                "attempt_id": str(result.inserted_id),
-                "quiz_id": quiz_id,
-                "quiz_title": quiz["title"],
-                "score": round(score, 2),
-                "completed_at": datetime.utcnow(),
-                "time_taken": submission_data.time_taken
-            }
-
-            await db.users.update_one(
-                {"_id": ObjectId(current_user.id)},
-                {
-                    "$set": {
-                        "total_attempts": total_attempts,
-                        "average_score": round(avg_score, 2)
-                    },
-                    "$push": {
-                        "quiz_attempts": attempt_record
-                    }
-                }
-            )
-
-        created_attempt = await db.attempts.find_one({"_id": result.inserted_id})
-        created_attempt["_id"] = str(created_attempt["_id"])
-
-        return created_attempt
+        async def create_attempt(attempt_id: Optional[ObjectId] = None):
+            answer_key = await answer_keys.get(db, quiz_id)
+            if answer_key is None:
+                raise HTTPException(status_code=404, detail="Quiz not found")
 
+            attempt_data = build_attempt_doc(
+                current_user.id, quiz_id, answer_key, submission_data.answers, submission_data.time_taken
+            )
+            if attempt_id is not None:
+                attempt_data["_id"] = attempt_id
+
+            if attempt_ingestion.enabled:
+                try:
+                    created_attempt = dict(await attempt_ingestion.submit(attempt_data))
+                except IngestionQueueFull:
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Too many submissions in progress, please retry",
+                        headers={"Retry-After": "1"}
+                    )
+            else:
+                result = await db.attempts.insert_one(attempt_data)
+                await record_stored_attempts(db, [attempt_data])
+
+                created_attempt = await db.attempts.find_one({"_id": result.inserted_id})
+
+            created_attempt["_id"] = str(created_attempt["_id"])
+            return created_attempt
+
+        if idempotency_key:
+            # Retries with the same key replay the stored attempt without re-scoring or writing
+            created_attempt = await idempotency_keys.run(db, current_user.id, idempotency_key, quiz_id, create_attempt)
+        else:
+            created_attempt = await create_attempt()
+        return attempt_serializer.response(created_attempt, status_code=201)
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Quiz submission error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to submit quiz: {str(e)}")
 
+@router.post("/attempts/batch", response_model=attempt.BatchAttemptResponse)
+async def submit_attempts_batch(
+    batch: attempt.BatchAttemptCreate,
+    current_user = Depends(get_current_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Score and store many attempts at once (offline and classroom sync)"""
+    results: List[attempt.BatchAttemptResult] = [None] * len(batch.attempts)
+    answer_key_map = await answer_keys.get_many(db, (item.quiz_id for item in batch.attempts))
+
+    requested_users = {item.user_id for item in batch.attempts if item.user_id and item.user_id != current_user.id}
+    known_users = set()
+    if requested_users and current_user.is_admin:
+        valid_ids = [ObjectId(user_id) for user_id in requested_users if ObjectId.is_valid(user_id)]
+        cursor = db.users.find({"_id": {"$in": valid_ids}}, {"_id": 1})
+        known_users = {str(doc["_id"]) async for doc in cursor}
+
+    docs, doc_indexes = [], []
+    for index, item in enumerate(batch.attempts):
+        user_id = item.user_id or current_user.id
+        error = None
+        if user_id != current_user.id and not current_user.is_admin:
+            error = "Only admins can submit attempts for other users"
+        elif user_id != current_user.id and user_id not in known_users:
+            error = "User not found"
+        elif item.quiz_id not in answer_key_map:
+            error = "Quiz not found"
+
+        if error:
+            results[index] = attempt.BatchAttemptResult(index=index, status="error", error=error)
+            continue
+
+        docs.append(build_attempt_doc(
+            user_id, item.quiz_id, answer_key_map[item.quiz_id],
+            item.answers, item.time_taken, item.completed_at
+        ))
+        doc_indexes.append(index)
+
+    if docs:
+        errors, warning = await write_attempts(db, docs)
+        for index, doc, error in zip(doc_indexes, docs, errors):
+            if error:
+                results[index] = attempt.BatchAttemptResult(index=index, status="error", error=error)
+            else:
+                results[index] = attempt.BatchAttemptResult(
+                    index=index, status="created", attempt_id=str(doc["_id"]), score=doc["score"], warning=warning
+                )
+
+    created = sum(1 for result in results if result.status == "created")
+    return attempt.BatchAttemptResponse(results=results, created=created, failed=len(results) - created)
+
 @router.get("/attempts/", response_model=List[attempt.Attempt])
 async def get_user_attempts(
     current_user = Depends(get_current_user),
     db: AsyncIOMotorClient = Depends(get_db),
-    limit: int = 20,
-    skip: int = 0
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor of the previous page"),
+    limit: int = Query(20, ge=1, le=settings.attempt_page_max, description="Number of attempts to return"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json pages, or ndjson to stream the whole history")
 ):
-    total_attempts = await db.attempts.count_documents({"user_id": current_user.id})
-
-    cursor = db.attempts.find({"user_id": current_user.id})
-    cursor = cursor.sort("completed_at", -1)
-    cursor = cursor.skip(skip).limit(limit)
-
-    attempts = await cursor.to_list(limit)
-    for attempt_doc in attempts:
-        attempt_doc["_id"] = str(attempt_doc["_id"])
-
-    return attempts
+    """Attempts newest first; the next page starts at X-Next-Cursor"""
+    return await history_response(db, current_user.id, limit, after, format)
 
 @router.get("/attempts/{attempt_id}", response_model=attempt.Attempt)
 async def get_attempt_by_id(
@@ -128,5 +150,4 @@ async def get_attempt_by_id(
     if not attempt_doc:
         raise HTTPException(status_code=404, detail="Attempt not found")
 
-    attempt_doc["_id"] = str(attempt_doc["_id"])
-    return attempt_doc
+    return attempt_serializer.response(attempt_doc)
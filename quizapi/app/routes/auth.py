@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 from bson import ObjectId
 
 from ..schemas import auth as auth_schemas, user as user_schemas
 from ..auth.jwt_handler import jwt_handler
+from ..auth.password_hasher import password_hasher
+from ..auth.rate_limit import auth_rate_limiter
+from ..auth.dependencies import get_current_user_with_token
+from ..auth.refresh_tokens import refresh_tokens
 from ..db.database import get_db
 
 router = APIRouter(
@@ -15,17 +19,20 @@ router = APIRouter(
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register_user(
     user_data: user_schemas.UserCreate,
+    request: Request,
     db: AsyncIOMotorClient = Depends(get_db)
 ):
     try:
-        existing_user = await db.users.find_one({"email": user_data.email})
+        await auth_rate_limiter.check_register(db, request, user_data.email)
+
+        existing_user = await db.users.find_one({"email": user_data.email}, {"_id": 1})
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
 
-        hashed_password = jwt_handler.hash_password(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
 
         user_doc = {
             "email": user_data.email,
@@ -37,7 +44,9 @@ async def register_user(
             "last_login": None,
             "total_attempts": 0,
             "quiz_attempts": [],
-            "average_score": 0.0
+            "average_score": 0.0,
+            "score_sum": 0.0,
+            "token_epoch": 0
         }
 
         result = await db.users.insert_one(user_doc)
@@ -59,17 +68,20 @@ async def register_user(
 @router.post("/login")
 async def login_user(
     login_data: auth_schemas.LoginRequest,
+    request: Request,
     db: AsyncIOMotorClient = Depends(get_db)
 ):
     try:
-        user = await db.users.find_one({"email": login_data.email})
+        await auth_rate_limiter.check_login(db, request, login_data.email)
+
+        user = await db.users.find_one({"email": login_data.email}, {"quiz_attempts": 0})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
 
-        if not jwt_handler.verify_password(login_data.password, user["hashed_password"]):
+        if not await password_hasher.verify(login_data.password, user["hashed_password"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
@@ -83,18 +95,19 @@ async def login_user(
 
         await db.users.update_one(
             {"_id": user["_id"]},
-            {"$set": {"last_login": datetime.now(timezone.utc)}}
+            {"$set": {"last_login": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
         )
 
         user_id = str(user["_id"])
         token_data = {
             "sub": user_id,
             "email": user["email"],
-            "is_admin": user.get("is_admin", False)
+            "is_admin": user.get("is_admin", False),
+            "token_epoch": user.get("token_epoch", 0)
         }
 
         access_token = jwt_handler.create_access_token(token_data)
-        refresh_token = jwt_handler.create_refresh_token({"sub": user_id})
+        refresh_token = await refresh_tokens.issue(db, user_id)
 
         user_response = {
             "id": user_id,
@@ -118,3 +131,58 @@ async def login_user(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Login failed: {str(e)}"
         )
+
+@router.post("/refresh", response_model=auth_schemas.TokenResponse)
+async def refresh_access_token(
+    refresh_data: auth_schemas.RefreshTokenRequest,
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Swap a refresh token for a new access token and a rotated refresh token"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    # Refresh tokens live for days; keep them out of the access-token cache
+    payload = jwt_handler.decode_uncached(refresh_data.refresh_token)
+    if payload is None or payload.get("type") != "refresh":
+        raise credentials_exception
+
+    user_id = payload.get("sub")
+    if not user_id or not ObjectId.is_valid(user_id):
+        raise credentials_exception
+
+    user = await db.users.find_one(
+        {"_id": ObjectId(user_id)},
+        {"email": 1, "is_admin": 1, "is_active": 1, "token_epoch": 1}
+    )
+    if user is None or not user.get("is_active", True):
+        raise credentials_exception
+
+    refresh_token = await refresh_tokens.rotate(db, payload)
+    if refresh_token is None:
+        raise credentials_exception
+
+    access_token = jwt_handler.create_access_token({
+        "sub": user_id,
+        "email": user["email"],
+        "is_admin": user.get("is_admin", False),
+        "token_epoch": user.get("token_epoch", 0)
+    })
+
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+@router.post("/logout")
+async def logout_user(
+    user_and_token = Depends(get_current_user_with_token),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    current_user, token = user_and_token
+    await jwt_handler.blacklist_token(token, db)
+    await refresh_tokens.revoke_user_families(db, current_user.id)
+    return {"message": "Logged out successfully"}
@@ -3,7 +3,9 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from pydantic import BaseModel
 
-from ..auth.jwt_handler import jwt_handler
+from ..auth.password_hasher import password_hasher
+from ..auth.refresh_tokens import refresh_tokens
+from ..auth.token_epochs import token_epochs
 from ..db.database import get_db
 from ..auth.dependencies import get_current_user
 
@@ -23,22 +25,22 @@ async def change_password(
     db: AsyncIOMotorClient = Depends(get_db)
 ):
     try:
-        user_id = current_user.id if hasattr(current_user, 'id') else current_user.get("id")
+        user_id = current_user.id
 
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        user = await db.users.find_one({"_id": ObjectId(user_id)}, {"hashed_password": 1})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
 
-        if not jwt_handler.verify_password(password_data.current_password, user["hashed_password"]):
+        if not await password_hasher.verify(password_data.current_password, user["hashed_password"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
             )
 
-        hashed_password = jwt_handler.hash_password(password_data.new_password)
+        hashed_password = await password_hasher.hash(password_data.new_password)
 
         result = await db.users.update_one(
             {"_id": ObjectId(user_id)},
@@ -51,6 +53,9 @@ async def change_password(
                 detail="Failed to update password"
             )
 
+        await token_epochs.bump(db, user_id)
+        await refresh_tokens.revoke_user_families(db, user_id)
+
         return {"message": "Password updated successfully"}
 
     except HTTPException:
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Any, Dict, List
+from bson import ObjectId
+from .. import schemas
+from ..db.database import get_db
+from ..auth.dependencies import get_current_user
+from ..services.leaderboards import leaderboards
+from ..services.quiz_cache import quiz_cache
+from ..utils.config import get_settings
+from ..utils.serialization import leaderboard_entry_serializer, leaderboard_serializer
+from motor.motor_asyncio import AsyncIOMotorClient
+
+router = APIRouter()
+settings = get_settings()
+
+
+async def check_quiz(db: AsyncIOMotorClient, quiz_id: str) -> None:
+    if not ObjectId.is_valid(quiz_id):
+        raise HTTPException(status_code=400, detail="Invalid quiz ID")
+    if await quiz_cache.get_version(db, quiz_id) is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+
+async def attach_names(db: AsyncIOMotorClient, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    user_ids = [ObjectId(entry["user_id"]) for entry in entries if ObjectId.is_valid(entry["user_id"])]
+    names = {
+        str(doc["_id"]): doc.get("full_name")
+        async for doc in db.users.find({"_id": {"$in": user_ids}}, {"full_name": 1})
+    }
+    return [{**entry, "full_name": names.get(entry["user_id"])} for entry in entries]
+
+
+@router.get("/quizzes/{quiz_id}/leaderboard", response_model=List[schemas.LeaderboardEntry])
+async def get_quiz_leaderboard(
+    quiz_id: str,
+    limit: int = Query(settings.leaderboard_size, ge=1, le=settings.leaderboard_size, description="Number of entries to return"),
+    current_user = Depends(get_current_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Best attempt per user, highest score first; equal scores rank the faster attempt higher"""
+    await check_quiz(db, quiz_id)
+    entries = await leaderboards.top(db, quiz_id, limit)
+    return leaderboard_serializer.response(await attach_names(db, entries))
+
+
+@router.get("/quizzes/{quiz_id}/leaderboard/me", response_model=schemas.LeaderboardEntry)
+async def get_my_leaderboard_rank(
+    quiz_id: str,
+    current_user = Depends(get_current_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """The caller's best attempt on the quiz and where it ranks"""
+    await check_quiz(db, quiz_id)
+    entry = await leaderboards.rank(db, quiz_id, current_user.id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No attempts on this quiz yet")
+    # The caller may be a stateless principal without profile fields
+    named, = await attach_names(db, [entry])
+    return leaderboard_entry_serializer.response(named)
@@ -1,15 +1,124 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+import orjson
 from .. import schemas
 from ..db.database import get_db
+from ..services import question_store
+from ..services.quiz_cache import quiz_cache
+from ..utils.config import get_settings
+from ..utils.etag import etag_matches, make_etag, not_modified
+from ..utils.serialization import questions_serializer
 from motor.motor_asyncio import AsyncIOMotorClient
 
 router = APIRouter()
+settings = get_settings()
 
 
-@router.get("/quizzes/{quiz_id}/questions/", response_model=List[schemas.Question])
-async def get_questions_for_quiz(quiz_id: str, db: AsyncIOMotorClient = Depends(get_db)):
-    quiz = await db.quizzes.find_one({"_id": quiz_id})
-    if quiz is None:
+async def load_question_page(
+    db: AsyncIOMotorClient,
+    quiz_id: str,
+    offset: int,
+    limit: int,
+    version: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Slice of a quiz's questions plus its version and question_count.
+
+    Served from the quiz cache when the quiz is already cached; otherwise
+    only the requested slice is read, from either storage layout. With
+    version given, the page must come from that version, or None is returned.
+    """
+    cached = quiz_cache.peek(quiz_id)
+    if cached is not None and (version is None or cached.get("version", 0) == version):
+        questions = cached.get("questions", [])
+        return {
+            "version": cached.get("version", 0),
+            "question_count": len(questions),
+            "questions": questions[offset:offset + limit]
+        }
+
+    return await question_store.load_page(db, quiz_id, offset, limit, version=version)
+
+
+def page_etag(quiz_id: str, version: int, offset: int, limit: Optional[int], format: str = "json") -> str:
+    """Each slice and format is its own representation, so all of them are part of its tag"""
+    return make_etag("questions", quiz_id, version, format, offset, limit or "all")
+
+
+def indexed(questions: List[Dict[str, Any]], offset: int) -> List[Dict[str, Any]]:
+    return [{**question, "index": offset + i} for i, question in enumerate(questions)]
+
+
+async def stream_questions(db: AsyncIOMotorClient, quiz_id: str, offset: int, limit: Optional[int]) -> StreamingResponse:
+    chunk_size = settings.question_stream_chunk_size
+    first = await load_question_page(db, quiz_id, offset, min(chunk_size, limit) if limit else chunk_size)
+    if first is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
-    return quiz["questions"]
\ No newline at end of file
+
+    version = first["version"]
+    end = first["question_count"] if limit is None else min(first["question_count"], offset + limit)
+
+    async def lines():
+        page, position = first, offset
+        while True:
+            yield questions_serializer.dump_lines(indexed(page["questions"], position))
+            position += len(page["questions"])
+            if position >= end or not page["questions"]:
+                return
+            # Every chunk is pinned to the version the stream started from
+            page = await load_question_page(db, quiz_id, position, min(chunk_size, end - position), version=version)
+            if page is None:
+                yield orjson.dumps({"error": "Quiz changed while streaming, please retry"}) + b"\n"
+                return
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={
+            "ETag": page_etag(quiz_id, version, offset, limit, "ndjson"),
+            "X-Total-Count": str(first["question_count"])
+        }
+    )
+
+
+@router.get("/quizzes/{quiz_id}/questions/", response_model=List[schemas.IndexedQuestion])
+async def get_questions_for_quiz(
+    quiz_id: str,
+    offset: int = Query(0, ge=0, description="Index of the first question to return"),
+    limit: Optional[int] = Query(None, ge=1, le=settings.question_page_max, description="Number of questions to return"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json pages, or ndjson to stream one question per line"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Page through a quiz's questions; the next page starts at X-Next-Offset.
+
+    format=ndjson streams every question from offset on (or up to limit)
+    without holding the whole bank in one response.
+    """
+    if not ObjectId.is_valid(quiz_id):
+        raise HTTPException(status_code=400, detail="Invalid quiz ID")
+
+    if format == "ndjson":
+        return await stream_questions(db, quiz_id, offset, limit)
+
+    limit = limit or settings.question_page_size
+    if if_none_match is not None:
+        version = await quiz_cache.get_version(db, quiz_id)
+        if version is not None:
+            etag = page_etag(quiz_id, version, offset, limit)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
+    page = await load_question_page(db, quiz_id, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    headers = {
+        "ETag": page_etag(quiz_id, page["version"], offset, limit),
+        "Cache-Control": "no-cache",
+        "X-Total-Count": str(page["question_count"])
+    }
+    if offset + limit < page["question_count"]:
+        headers["X-Next-Offset"] = str(offset + limit)
+    return questions_serializer.response(indexed(page["questions"], offset), headers=headers)
@@ -1,28 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from typing import List, Optional
 from bson import ObjectId
 from .. import schemas, models
 from ..db.database import get_db
+from ..services.quiz_cache import quiz_cache
+from ..utils.etag import digest_etag, etag_matches, make_etag, not_modified
+from ..utils.serialization import quiz_summaries_serializer
 from motor.motor_asyncio import AsyncIOMotorClient
 
 router = APIRouter()
 
 
-@router.get("/quizzes/", response_model=List[schemas.Quiz])
-async def get_quizzes(db: AsyncIOMotorClient = Depends(get_db)):
-    quizzes = await db.quizzes.find().to_list(1000)
-    for quiz in quizzes:
-        quiz["_id"] = str(quiz["_id"])
-    return quizzes
+@router.get("/quizzes/", response_model=List[schemas.QuizSummary])
+async def get_quizzes(
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=200, description="Number of quizzes to return"),
+    difficulty: Optional[str] = Query(None, description="Filter by difficulty: easy, medium, or hard"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorClient = Depends(get_db)
+):  # List quiz summaries; full questions are only served by GET /quizzes/{quiz_id}
+    match = {}
+    if difficulty:
+        match["difficulty"] = difficulty
+    if after:
+        if not ObjectId.is_valid(after):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        match["_id"] = {"$gt": ObjectId(after)}
+
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"_id": 1}},
+        {"$limit": limit + 1},
+        {"$project": {
+            "title": 1,
+            "description": 1,
+            "difficulty": 1,
+            "time_limit": 1,
+            "version": {"$ifNull": ["$version", 0]},
+            "question_count": {"$ifNull": ["$question_count", {"$size": {"$ifNull": ["$questions", []]}}]}
+        }}
+    ]
+    quizzes = await db.quizzes.aggregate(pipeline).to_list(limit + 1)
+
+    next_cursor = None
+    if len(quizzes) > limit:
+        quizzes = quizzes[:limit]
+        next_cursor = str(quizzes[-1]["_id"])
+
+    # The page changes exactly when a quiz on it is added, removed or bumped to a new version
+    etag = digest_etag([next_cursor] + [f"{quiz['_id']}:{quiz['version']}" for quiz in quizzes])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    return quiz_summaries_serializer.response(quizzes, headers=headers)
 
 @router.get("/quizzes/{quiz_id}", response_model=schemas.Quiz)
-async def get_quiz(quiz_id: str, db: AsyncIOMotorClient = Depends(get_db)):
+async def get_quiz(
+    quiz_id: str,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
     if not ObjectId.is_valid(quiz_id):
         raise HTTPException(status_code=400, detail="Invalid quiz ID")
 
-    quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
-    if quiz is None:
+    if if_none_match is not None:
+        # Revalidation only needs the version, not the document
+        version = await quiz_cache.get_version(db, quiz_id)
+        if version is not None:
+            etag = make_etag("quiz", quiz_id, version)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
+    entry = await quiz_cache.get_entry(db, quiz_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Quiz not found")
 
-    quiz["_id"] = str(quiz["_id"])
-    return quiz
\ No newline at end of file
+    quiz, body = entry
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": make_etag("quiz", quiz_id, quiz.get("version", 0)), "Cache-Control": "no-cache"}
+    )
\ No newline at end of file
@@ -1,23 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from typing import List, Optional
 from ..schemas import user, attempt
 from ..db.database import get_db
-from ..db.init_db import update_user_stats
 from ..auth.dependencies import get_current_user, get_current_active_user
+from ..auth.token_epochs import token_epochs
+from ..auth.user_cache import user_cache
+from ..services import timeline
+from ..services.attempt_history import history_response
+from ..utils.config import get_settings
+from ..utils.etag import etag_matches, make_etag, not_modified
+from ..utils.serialization import dashboard_serializer, user_serializer
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from datetime import datetime,timezone
-import bcrypt
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
     responses={404: {"description": "Not found"}},
 )
+settings = get_settings()
 
 @router.get("/me", response_model=user.User)
-async def get_current_user_profile(current_user: user.User = Depends(get_current_user)):
-    return current_user
+async def get_current_user_profile(
+    if_none_match: Optional[str] = Header(None),
+    current_user: user.User = Depends(get_current_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Full profile, including the recent attempts window left out of auth lookups"""
+    if if_none_match is not None:
+        # Every write that changes the profile bumps version, so revalidating reads only that field
+        state = await db.users.find_one({"_id": ObjectId(current_user.id)}, {"version": 1, "is_active": 1})
+        if state is not None and state.get("is_active", True):
+            etag = make_etag("user", current_user.id, state.get("version", 0))
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, cache_control="private, no-cache")
+
+    profile = await db.users.find_one({"_id": ObjectId(current_user.id)}, {"hashed_password": 0})
+    if profile is None or not profile.get("is_active", True):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return user_serializer.response(profile, headers={
+        "ETag": make_etag("user", current_user.id, profile.get("version", 0)),
+        "Cache-Control": "private, no-cache"
+    })
 
 @router.put("/me", response_model=user.User)
 async def update_current_user(
@@ -30,25 +60,24 @@ async def update_current_user(
         raise HTTPException(status_code=400, detail="No update data provided")
     result = await db.users.update_one(
         {"_id": ObjectId(current_user.id)},
-        {"$set": update_data}
+        {"$set": update_data, "$inc": {"version": 1}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
-    updated_user = await db.users.find_one({"_id": ObjectId(current_user.id)})
-    updated_user["_id"] = str(updated_user["_id"])
-    return user.User(**updated_user)
+    await user_cache.invalidate(db, current_user.id)
+    updated_user = await db.users.find_one({"_id": ObjectId(current_user.id)}, {"hashed_password": 0})
+    return user_serializer.response(updated_user)
 
 @router.get("/me/attempts", response_model=List[attempt.Attempt])
 async def get_user_attempts(
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=settings.attempt_page_max, description="Number of attempts to return"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json pages, or ndjson to stream the whole history"),
     current_user: user.User = Depends(get_current_active_user),
     db: AsyncIOMotorClient = Depends(get_db)
 ):
-    attempts = await db.attempts.find({"user_id": current_user.id}).sort("attempt_date", -1).to_list(1000)
-    for attempt_doc in attempts:
-        attempt_doc["_id"] = str(attempt_doc["_id"])
-        if "attempt_date" in attempt_doc and attempt_doc["attempt_date"]:
-            attempt_doc["attempt_date"] = attempt_doc["attempt_date"].isoformat()
-    return attempts
+    """Attempts newest first; the next page starts at X-Next-Cursor"""
+    return await history_response(db, current_user.id, limit, after, format)
 
 @router.get("/me/stats")
 async def get_user_stats(
@@ -60,7 +89,7 @@ async def get_user_stats(
         raise HTTPException(status_code=404, detail="User not found")
     recent_attempts = await db.attempts.find(
         {"user_id": current_user.id}
-    ).sort("attempt_date", -1).limit(10).to_list(10)
+    ).sort("completed_at", -1).limit(10).to_list(10)
     best_score = max((attempt_["score"] for attempt_ in recent_attempts), default=0.0)
     recent_average = sum(attempt_["score"] for attempt_ in recent_attempts) / len(recent_attempts) if recent_attempts else 0.0
     return {
@@ -79,7 +108,7 @@ async def update_last_login(
 ):
     result = await db.users.update_one(
         {"_id": ObjectId(current_user.id)},
-        {"$set": {"last_login": datetime.now(timezone.utc)}}
+        {"$set": {"last_login": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -92,65 +121,70 @@ async def delete_current_user(
 ):
     result = await db.users.update_one(
         {"_id": ObjectId(current_user.id)},
-        {"$set": {"is_active": False, "deleted_at": datetime.now(timezone.utc)}}
+        {"$set": {"is_active": False, "deleted_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    await user_cache.invalidate(db, current_user.id)
+    await token_epochs.bump(db, current_user.id)
+
+@router.get("/me/timeline")
+async def get_score_timeline(
+    points: int = Query(settings.timeline_default_points, ge=3, le=settings.timeline_max_points, description="Maximum number of points to return"),
+    granularity: str = Query(timeline.DAY, pattern="^(day|week|month)$", description="Bucket size for method=buckets"),
+    method: str = Query(timeline.BUCKETS, pattern="^(buckets|lttb)$", description="buckets: mean/min/max per period; lttb: shape-preserving pick of individual attempts"),
+    current_user: user.User = Depends(get_current_active_user),
+    db: AsyncIOMotorClient = Depends(get_db)
+):
+    """Score history downsampled server-side to at most points entries.
+
+    method=buckets averages scores per day, week or month (read from the
+    daily rollup) and merges neighbouring buckets if there are still too
+    many. method=lttb keeps a subset of the actual attempts chosen by
+    Largest-Triangle-Three-Buckets; granularity does not apply to it.
+    """
+    return await timeline.score_timeline(db, current_user.id, points, granularity, method)
 
-@router.get("/dashboard")
+
+@router.get("/dashboard", response_model=user.UserDashboard)
 async def get_user_dashboard(
     current_user: user.User = Depends(get_current_active_user),
     db: AsyncIOMotorClient = Depends(get_db)
 ):
     user_id = current_user.id
 
-    user_doc = await db.users.find_one({"_id": ObjectId(user_id)})
+    user_doc = await db.users.find_one({"_id": ObjectId(user_id)}, {"last_login": 1})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
 
-    total_quizzes = await db.quizzes.count_documents({})
-
-    user_attempts = await db.attempts.find({"user_id": user_id}).sort("completed_at", -1).to_list(1000)
-
-    total_attempts = len(user_attempts)
-    completed_quizzes = len(set(attempt["quiz_id"] for attempt in user_attempts))
-
-    total_minutes = sum(attempt.get("time_taken", 0) for attempt in user_attempts) / 60
+    total_quizzes = await db.quizzes.estimated_document_count()
 
-    avg_score = sum(attempt["score"] for attempt in user_attempts) / total_attempts if total_attempts > 0 else 0
+    # Totals and the timeline come from the per-day rollup, so the work grows with days active, not attempts
+    days = await timeline.period_buckets(db, user_id, timeline.DAY)
+    total_attempts = sum(day.count for day in days)
+    score_sum = sum(day.score_sum for day in days)
+    total_seconds = sum(day.seconds for day in days)
+    timeline_data = [bucket.point() for bucket in timeline.downsample_buckets(days, settings.timeline_default_points)]
 
-    recent_attempts = user_attempts[:10]
-    for attempt in recent_attempts:
-        attempt["_id"] = str(attempt["_id"])
-        if "completed_at" in attempt and attempt["completed_at"]:
-            if isinstance(attempt["completed_at"], str):
-                pass
-            else:
-                attempt["completed_at"] = attempt["completed_at"].isoformat()
+    completed_quizzes = len(await db.attempts.distinct("quiz_id", {"user_id": user_id}))
 
-    timeline_data = []
-    for attempt in user_attempts:
-        completed_at = attempt.get("completed_at")
-        if completed_at:
-            date_str = completed_at if isinstance(completed_at, str) else completed_at.isoformat()
-            timeline_data.append({
-                "date": date_str,
-                "score": attempt["score"],
-                "quiz_title": attempt.get("quiz_title", "Unknown Quiz")
-            })
+    recent_attempts = await db.attempts.find(
+        {"user_id": user_id},
+        {"user_id": 1, "quiz_id": 1, "score": 1, "completed_at": 1, "time_taken": 1}
+    ).sort("completed_at", -1).limit(10).to_list(10)
 
-    timeline_data.sort(key=lambda x: x["date"])
+    avg_score = score_sum / total_attempts if total_attempts > 0 else 0
 
     website_views = 1500
 
-    return {
+    return dashboard_serializer.response({
         "totalQuizzes": total_quizzes,
         "completedQuizzes": completed_quizzes,
         "totalAttempts": total_attempts,
-        "totalMinutes": round(total_minutes, 2),
+        "totalMinutes": round(total_seconds / 60, 2),
         "averageScore": round(avg_score, 2),
-        "lastLogin": user_doc.get("last_login").isoformat() if user_doc.get("last_login") else None,
+        "lastLogin": user_doc.get("last_login"),
         "recentAttempts": recent_attempts,
         "scoreTimeline": timeline_data,
         "websiteViews": website_views
-    }
+    })
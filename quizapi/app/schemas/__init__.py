@@ -2,13 +2,16 @@
 from .user import User, UserBase, UserCreate, UserUpdate
 
 # Quiz schemas
-from .quiz import Quiz, QuizBase, QuizCreate
+from .quiz import Quiz, QuizBase, QuizCreate, QuizSummary
 
 # Question schemas
-from .question import Question, QuestionBase, QuestionCreate
+from .question import IndexedQuestion, Question, QuestionBase, QuestionCreate
 
 # Attempt schemas
-from .attempt import Attempt, AttemptBase, AttemptCreate
+from .attempt import Attempt, AttemptBase, AttemptSummary, AttemptCreate, BatchAttemptCreate, BatchAttemptResponse
+
+# Leaderboard schemas
+from .leaderboard import LeaderboardEntry
 
 # Auth schemas
 from .auth import (
@@ -26,13 +29,16 @@ __all__ = [
     "User", "UserBase", "UserCreate", "UserUpdate",
 
     # Quiz schemas
-    "Quiz", "QuizBase", "QuizCreate",
+    "Quiz", "QuizBase", "QuizCreate", "QuizSummary",
 
     # Question schemas
-    "Question", "QuestionBase", "QuestionCreate",
+    "Question", "QuestionBase", "QuestionCreate", "IndexedQuestion",
 
     # Attempt schemas
-    "Attempt", "AttemptBase", "AttemptCreate",
+    "Attempt", "AttemptBase", "AttemptSummary", "AttemptCreate", "BatchAttemptCreate", "BatchAttemptResponse",
+
+    # Leaderboard schemas
+    "LeaderboardEntry",
 
     # Auth schemas
     "LoginRequest", "LoginResponse", "RefreshTokenRequest",
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from .common import ObjectIdStr
 
 class AnswerData(BaseModel):
     question_index: int = Field(..., description="Index of the question")
@@ -14,8 +15,28 @@ class AttemptBase(BaseModel):
 class AttemptCreate(AttemptBase):
     pass
 
+class BatchAttemptItem(AttemptCreate):
+    user_id: Optional[str] = Field(None, description="Owner of the attempt (admins only), defaults to the caller")
+    completed_at: Optional[datetime] = Field(None, description="When the attempt was completed, for offline uploads")
+
+class BatchAttemptCreate(BaseModel):
+    attempts: List[BatchAttemptItem] = Field(..., min_length=1, max_length=1000, description="Attempts to submit")
+
+class BatchAttemptResult(BaseModel):
+    index: int = Field(..., description="Position of the attempt in the submitted batch")
+    status: str = Field(..., description="created or error")
+    attempt_id: Optional[str] = Field(None, description="The ID of the stored attempt")
+    score: Optional[float] = Field(None, description="Score achieved in the attempt")
+    error: Optional[str] = Field(None, description="Why the attempt was rejected")
+    warning: Optional[str] = Field(None, description="Set when the attempt was stored but a follow-up update failed")
+
+class BatchAttemptResponse(BaseModel):
+    results: List[BatchAttemptResult]
+    created: int
+    failed: int
+
 class Attempt(BaseModel):
-    id: str = Field(..., alias="_id", description="The unique identifier of the attempt")
+    id: ObjectIdStr = Field(..., alias="_id", description="The unique identifier of the attempt")
     user_id: str = Field(..., description="The ID of the user who made the attempt")
     quiz_id: str = Field(..., description="The ID of the quiz being attempted")
     answers: List[AnswerData] = Field(..., description="List of answers with question indices and selected options")
@@ -31,3 +52,13 @@ class Attempt(BaseModel):
             datetime: lambda v: v.isoformat() if v else None
         }
     }
+
+class AttemptSummary(BaseModel):
+    id: ObjectIdStr = Field(..., alias="_id", description="The unique identifier of the attempt")
+    user_id: str = Field(..., description="The ID of the user who made the attempt")
+    quiz_id: str = Field(..., description="The ID of the quiz being attempted")
+    score: float = Field(..., description="Score achieved in the attempt")
+    completed_at: datetime = Field(..., description="When the attempt was completed")
+    time_taken: Optional[int] = Field(None, description="Time taken in seconds")
+
+    model_config = {"populate_by_name": True}
@@ -16,6 +16,7 @@ class RefreshTokenRequest(BaseModel):
 
 class TokenResponse(BaseModel):
     access_token: str = Field(..., description="New JWT access token")
+    refresh_token: Optional[str] = Field(None, description="Rotated refresh token, replaces the one sent")
     token_type: str = Field(default="bearer", description="Token type")
 
 class ChangePasswordRequest(BaseModel):
@@ -0,0 +1,12 @@
+from typing import Annotated, Any
+
+from bson import ObjectId
+from pydantic import BeforeValidator
+
+
+def _object_id_to_str(value: Any) -> Any:
+    return str(value) if isinstance(value, ObjectId) else value
+
+
+# Accepts raw Mongo documents, so handlers need not convert _id by hand
+ObjectIdStr = Annotated[str, BeforeValidator(_object_id_to_str)]
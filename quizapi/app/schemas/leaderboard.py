@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+class LeaderboardEntry(BaseModel):
+    rank: int = Field(..., description="1-based position on the quiz leaderboard")
+    user_id: str = Field(..., description="The ID of the user")
+    full_name: Optional[str] = Field(None, description="The user's name, if they still exist")
+    score: float = Field(..., description="The user's best score on the quiz")
+    time_taken: Optional[int] = Field(None, description="Time taken in seconds by that attempt, which breaks ties")
+    completed_at: datetime = Field(..., description="When that attempt was completed")
+    attempt_id: str = Field(..., description="The ID of the user's best attempt")
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
+from .common import ObjectIdStr
 
 class OptionBase(BaseModel):
     option_text: str = Field(..., min_length=1, description="The text of the option.")
@@ -12,8 +13,11 @@ class QuestionBase(BaseModel):
 class QuestionCreate(QuestionBase):
     pass
 
+class IndexedQuestion(QuestionBase):
+    index: int = Field(..., description="Position of the question in its quiz, sent back as question_index.")
+
 class Question(QuestionBase):
-    id: str = Field(..., alias="_id", description="The unique identifier of the question.")
+    id: ObjectIdStr = Field(..., alias="_id", description="The unique identifier of the question.")
 
     model_config = {
         "from_attributes": True,
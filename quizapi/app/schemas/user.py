@@ -1,6 +1,8 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Dict, Any
+from typing import Any, Dict, Optional, List
 from datetime import datetime
+from .attempt import AttemptSummary
+from .common import ObjectIdStr
 
 class UserBase(BaseModel):
     email: EmailStr = Field(..., description="The email address of the user.")
@@ -21,13 +23,13 @@ class QuizAttemptRecord(BaseModel):
     time_taken: Optional[int] = Field(None, description="Time taken in seconds")
 
 class User(UserBase):
-    id: str = Field(..., alias="_id", description="The unique identifier of the user.")
+    id: ObjectIdStr = Field(..., alias="_id", description="The unique identifier of the user.")
     is_active: bool = Field(default=True, description="Whether the user account is active.")
     is_admin: bool = Field(default=False, description="Whether the user has admin privileges.")
     registration_date: datetime = Field(..., description="When the user registered.")
     last_login: Optional[datetime] = Field(None, description="When the user last logged in.")
     total_attempts: int = Field(default=0, description="Total number of quiz attempts.")
-    quiz_attempts: List[Dict[str, Any]] = Field(default=[], description="List of quiz attempt records.")
+    quiz_attempts: List[QuizAttemptRecord] = Field(default=[], description="List of quiz attempt records.")
     average_score: float = Field(default=0.0, description="Average score across all attempts.")
 
     model_config = {
@@ -47,3 +49,16 @@ class UserStats(BaseModel):
     active_users: int
     total_attempts: int
     average_score: float
+
+class UserDashboard(BaseModel):
+    total_quizzes: int = Field(..., alias="totalQuizzes", description="Number of quizzes on the site")
+    completed_quizzes: int = Field(..., alias="completedQuizzes", description="Number of distinct quizzes the user attempted")
+    total_attempts: int = Field(..., alias="totalAttempts", description="Total number of quiz attempts")
+    total_minutes: float = Field(..., alias="totalMinutes", description="Time spent on attempts, in minutes")
+    average_score: float = Field(..., alias="averageScore", description="Average score across all attempts")
+    last_login: Optional[datetime] = Field(None, alias="lastLogin", description="When the user last logged in")
+    recent_attempts: List[AttemptSummary] = Field(..., alias="recentAttempts", description="The user's latest attempts, newest first")
+    score_timeline: List[Dict[str, Any]] = Field(..., alias="scoreTimeline", description="Mean, min and max score per period")
+    website_views: int = Field(..., alias="websiteViews", description="Site-wide page views")
+
+    model_config = {"populate_by_name": True}
@@ -0,0 +1,104 @@
+import base64
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from ..utils.config import get_settings
+from ..utils.serialization import attempts_serializer
+
+# Newest first; _id breaks ties between attempts completed in the same millisecond
+HISTORY_SORT = [("completed_at", -1), ("_id", -1)]
+
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque token for the position right after doc in history order"""
+    completed_at = doc["completed_at"].replace(tzinfo=None)  # Mongo returns naive UTC at millisecond precision
+    raw = f"{(completed_at - _EPOCH) // _MILLISECOND}.{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        millis, attempt_id = raw.split(".")
+        return _EPOCH + int(millis) * _MILLISECOND, ObjectId(attempt_id)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def history_filter(user_id: str, after: Optional[str] = None) -> Dict[str, Any]:
+    """A user's attempts, from after's position on if given"""
+    query: Dict[str, Any] = {"user_id": user_id}
+    if after:
+        completed_at, attempt_id = decode_cursor(after)
+        # The $lte bound keeps the index scan starting at the cursor whichever way the $or is planned
+        query["completed_at"] = {"$lte": completed_at}
+        query["$or"] = [
+            {"completed_at": {"$lt": completed_at}},
+            {"completed_at": completed_at, "_id": {"$lt": attempt_id}}
+        ]
+    return query
+
+
+async def load_history_page(
+    db: AsyncIOMotorClient,
+    user_id: str,
+    limit: int,
+    after: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of attempts and the cursor for the next one (None on the last page).
+
+    Each page seeks straight to its position through the (user_id,
+    completed_at, _id) index, so deep pages cost the same as the first.
+    """
+    cursor = db.attempts.find(history_filter(user_id, after)).sort(HISTORY_SORT).limit(limit + 1)
+    attempts = await cursor.to_list(limit + 1)
+
+    next_cursor = None
+    if len(attempts) > limit:
+        attempts = attempts[:limit]
+        next_cursor = encode_cursor(attempts[-1])
+    return attempts, next_cursor
+
+
+def stream_history(db: AsyncIOMotorClient, user_id: str, after: Optional[str] = None) -> StreamingResponse:
+    """Every attempt from after on as NDJSON, written batch by batch as the cursor yields them"""
+    query = history_filter(user_id, after)
+    batch_size = get_settings().attempt_stream_batch_size
+
+    async def lines():
+        cursor = db.attempts.find(query).sort(HISTORY_SORT).batch_size(batch_size)
+        batch: List[Dict[str, Any]] = []
+        async for attempt in cursor:
+            batch.append(attempt)
+            if len(batch) >= batch_size:
+                yield attempts_serializer.dump_lines(batch)
+                batch = []
+        if batch:
+            yield attempts_serializer.dump_lines(batch)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def history_response(
+    db: AsyncIOMotorClient,
+    user_id: str,
+    limit: int,
+    after: Optional[str],
+    format: str
+):
+    """The shared body of the attempt history endpoints: a JSON page, or the NDJSON export"""
+    if format == "ndjson":
+        return stream_history(db, user_id, after)
+
+    attempts, next_cursor = await load_history_page(db, user_id, limit, after)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return attempts_serializer.response(attempts, headers=headers)
@@ -0,0 +1,170 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from .leaderboards import leaderboards
+from .scoring import AnswerKey
+from .user_stats import attempt_record, attempt_stats_update, record_daily_stats
+from ..auth.user_cache import user_cache
+from ..schemas.attempt import AnswerData
+
+
+def build_attempt_doc(
+    user_id: str,
+    quiz_id: str,
+    answer_key: AnswerKey,
+    answers: Iterable[AnswerData],
+    time_taken: Optional[int],
+    completed_at: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Score a submission and build the document stored in the attempts collection"""
+    answers = list(answers)
+    if completed_at is None:
+        completed_at = datetime.utcnow()
+    elif completed_at.tzinfo is not None:
+        # Stored and compared as naive UTC, like the default and what Mongo returns
+        completed_at = completed_at.astimezone(timezone.utc).replace(tzinfo=None)
+    _, score = answer_key.score((answer.question_index, answer.selected_options) for answer in answers)
+    return {
+        "user_id": user_id,
+        "quiz_id": quiz_id,
+        "quiz_title": answer_key.title,
+        "answers": [answer.model_dump() for answer in answers],
+        "score": score,
+        "completed_at": completed_at,
+        "time_taken": time_taken,
+        "question_layout": answer_key.layout
+    }
+
+
+def _without_question(answers: Any, index: int) -> Dict[str, Any]:
+    """Expression dropping the answer to question index and moving later answers down one index"""
+    return {"$map": {
+        "input": {"$filter": {"input": answers, "cond": {"$ne": ["$$this.question_index", index]}}},
+        "as": "answer",
+        "in": {"$mergeObjects": ["$$answer", {"question_index": {"$cond": [
+            {"$gt": ["$$answer.question_index", index]},
+            {"$subtract": ["$$answer.question_index", 1]},
+            "$$answer.question_index"
+        ]}}]}
+    }}
+
+
+async def remap_removed_questions(db: AsyncIOMotorClient, quiz_id: str, removed: List[int]) -> int:
+    """Bring attempts recorded before question removals in line with the current indexes.
+
+    removed is the quiz's removed_questions: entry k - 1 is the index
+    removed to reach question_layout k. Every attempt at an earlier layout,
+    including ones written late by a worker still holding an old answer
+    key, has each removal after its own layout applied in order. Returns
+    the number of attempts remapped.
+    """
+    layout = len(removed)
+    if layout == 0:
+        return 0
+
+    stages = []
+    for k, index in enumerate(removed, start=1):
+        # question_layout still holds the attempt's original layout until the last stage
+        stages.append({"$set": {"answers": {"$cond": [
+            {"$lt": [{"$ifNull": ["$question_layout", 0]}, k]},
+            _without_question("$answers", index),
+            "$answers"
+        ]}}})
+    stages.append({"$set": {"question_layout": layout}})
+
+    result = await db.attempts.update_many(
+        {"quiz_id": quiz_id, "question_layout": {"$not": {"$gte": layout}}},
+        [{"$set": {"answers": {"$ifNull": ["$answers", []]}}}] + stages
+    )
+    return result.modified_count
+
+
+async def record_stored_attempts(db: AsyncIOMotorClient, stored: List[Dict[str, Any]]) -> Optional[str]:
+    """Fold attempts that are already inserted into user stats, the daily rollup and leaderboards.
+
+    These writes follow the insert without a transaction (which would need
+    a replica set), so until they land the aggregates lag the attempts
+    collection. If they fail, the attempts are committed regardless and
+    must not be reported as failed (a retry would store them twice).
+    Instead the failure is logged, returned, and recorded in stats_repairs
+    for repair_attempt_stats (init_db) to recompute the affected users
+    and quizzes from the attempts collection.
+    """
+    records_by_user: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for doc in stored:
+        records_by_user[doc["user_id"]].append(attempt_record(str(doc["_id"]), doc))
+    if not records_by_user:
+        return None
+
+    try:
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(user_id)},
+                attempt_stats_update(sorted(records, key=lambda record: record["completed_at"]))
+            )
+            for user_id, records in records_by_user.items()
+        ]
+        await db.users.bulk_write(operations, ordered=False)
+        for user_id in records_by_user:
+            user_cache.evict(user_id)
+        await record_daily_stats(db, stored)
+        await leaderboards.record(db, stored)
+    except Exception as e:
+        print(f"Attempt statistics update failed for users {', '.join(records_by_user)}: {e}")
+        await note_stats_repair(db, list(records_by_user), sorted({doc["quiz_id"] for doc in stored}), str(e))
+        return "Attempt stored, but statistics are delayed until they are reconciled"
+    return None
+
+
+async def note_stats_repair(db: AsyncIOMotorClient, user_ids: List[str], quiz_ids: List[str], error: str) -> None:
+    """Record users and quizzes whose aggregates missed attempts, for repair_attempt_stats"""
+    try:
+        await db.stats_repairs.insert_one({
+            "user_ids": user_ids,
+            "quiz_ids": quiz_ids,
+            "error": error,
+            "failed_at": datetime.now(timezone.utc)
+        })
+    except Exception as e:
+        print(f"Could not record statistics repair for users {', '.join(user_ids)}, "
+              f"POST /api/admin/maintenance/reconcile-user-stats recomputes every user's totals: {e}")
+
+
+async def write_attempts(db: AsyncIOMotorClient, attempt_docs: List[Dict[str, Any]]) -> Tuple[List[Optional[str]], Optional[str]]:
+    """Insert attempts with one unordered insert_many and update every owner's stats with one bulk_write.
+
+    Returns one entry per document, None when stored and otherwise the
+    write error, plus the warning from record_stored_attempts if any. If the
+    insert fails without per-document errors (e.g. the connection drops
+    partway), the documents already stored are looked up by _id and only
+    the rest are reported as failed; if even that lookup fails, the
+    original error is raised.
+    """
+    for doc in attempt_docs:
+        doc.setdefault("_id", ObjectId())
+
+    errors: List[Optional[str]] = [None] * len(attempt_docs)
+    try:
+        await db.attempts.insert_many(attempt_docs, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            errors[write_error["index"]] = write_error.get("errmsg", "Failed to store attempt")
+    except PyMongoError as e:
+        ids = [doc["_id"] for doc in attempt_docs]
+        try:
+            found = {stored["_id"] async for stored in db.attempts.find({"_id": {"$in": ids}}, {"_id": 1})}
+        except PyMongoError:
+            raise e
+        for i, doc in enumerate(attempt_docs):
+            if doc["_id"] not in found:
+                errors[i] = str(e) or "Failed to store attempt"
+
+    stored = [doc for doc, error in zip(attempt_docs, errors) if error is None]
+    warning = await record_stored_attempts(db, stored)
+    return errors, warning
@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..utils.cache import TTLCache
+from ..utils.config import get_settings
+
+
+class IdempotencyStore:
+    """Replays quiz submissions that carry an Idempotency-Key header.
+
+    Keys are scoped per user and recorded in the TTL-indexed idempotency_keys
+    collection, which links them to the attempt they produced. Completed
+    results are also kept in a short per-worker cache, and concurrent
+    requests with the same key on one worker share a single in-flight
+    operation. A key claimed by another worker is awaited until it
+    completes, or taken over once the claim's lease (idempotency_lease_seconds)
+    runs out, as when that worker died mid-request. The attempt id is fixed
+    at claim time and passed to operation, so a failure after the attempt
+    was stored keeps the key and replays that attempt.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.results = TTLCache(
+            maxsize=self.settings.idempotency_cache_size,
+            ttl=self.settings.idempotency_cache_ttl_seconds
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _check_quiz(self, attempt: Dict[str, Any], quiz_id: str) -> Dict[str, Any]:
+        if attempt["quiz_id"] != quiz_id:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different quiz"
+            )
+        return attempt
+
+    async def run(
+        self,
+        db: AsyncIOMotorClient,
+        user_id: str,
+        key: str,
+        quiz_id: str,
+        operation: Callable[[ObjectId], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Run operation(attempt_id) once per (user, key) and return its stored attempt on every replay"""
+        if len(key) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+        scoped_key = f"{user_id}:{key}"
+        cached = self.results.get(scoped_key)
+        if cached is not None:
+            return self._check_quiz(cached, quiz_id)
+
+        inflight = self._inflight.get(scoped_key)
+        if inflight is not None:
+            return self._check_quiz(await asyncio.shield(inflight), quiz_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[scoped_key] = future
+        try:
+            attempt = await self._execute(db, scoped_key, quiz_id, operation)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            future.set_result(attempt)
+            self.results.set(scoped_key, attempt)
+            return attempt
+        finally:
+            self._inflight.pop(scoped_key, None)
+
+    def _lease_end(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.settings.idempotency_lease_seconds)
+
+    async def _execute(
+        self,
+        db: AsyncIOMotorClient,
+        scoped_key: str,
+        quiz_id: str,
+        operation: Callable[[ObjectId], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        # The attempt id is fixed when the key is claimed, so whoever completes the key writes the same attempt
+        attempt_id = ObjectId()
+        try:
+            await db.idempotency_keys.insert_one({
+                "_id": scoped_key,
+                "quiz_id": quiz_id,
+                "status": "pending",
+                "attempt_id": str(attempt_id),
+                "lease_until": self._lease_end(),
+                "created_at": datetime.now(timezone.utc)
+            })
+        except DuplicateKeyError:
+            record = self._check_quiz(await self._wait_for_stored(db, scoped_key), quiz_id)
+            if record["status"] == "done":
+                return await self._load_attempt(db, scoped_key, record)
+            # Reclaimed after its holder's lease ran out; a late insert by that holder collides on the id
+            attempt_id = ObjectId(record["attempt_id"])
+
+        try:
+            attempt = await operation(attempt_id)
+        except BaseException as e:
+            stored = await db.attempts.find_one({"_id": attempt_id})
+            if stored is None:
+                # Release the key so the client can retry a submission that never completed
+                await db.idempotency_keys.delete_one({"_id": scoped_key, "status": "pending", "attempt_id": str(attempt_id)})
+                raise
+            # The attempt was stored before the failure; keep the key so retries replay it
+            await self._mark_done(db, scoped_key)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            stored["_id"] = str(stored["_id"])
+            return stored
+
+        await self._mark_done(db, scoped_key)
+        return attempt
+
+    async def _mark_done(self, db: AsyncIOMotorClient, scoped_key: str) -> None:
+        await db.idempotency_keys.update_one(
+            {"_id": scoped_key},
+            {"$set": {"status": "done"}, "$unset": {"lease_until": ""}}
+        )
+
+    async def _wait_for_stored(self, db: AsyncIOMotorClient, scoped_key: str) -> Dict[str, Any]:
+        """Wait for a key claimed elsewhere to complete, or take it over once its lease expires.
+
+        Returns the key's record: done, or pending and now leased to this caller.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.settings.idempotency_wait_seconds
+        while True:
+            record = await db.idempotency_keys.find_one({"_id": scoped_key})
+            if record is None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key failed, please retry"
+                )
+            if record["status"] == "done":
+                return record
+
+            # Only one caller can move an expired lease forward
+            reclaimed = await db.idempotency_keys.find_one_and_update(
+                {"_id": scoped_key, "status": "pending", "lease_until": {"$lte": datetime.now(timezone.utc)}},
+                {"$set": {"lease_until": self._lease_end()}},
+                return_document=ReturnDocument.AFTER
+            )
+            if reclaimed is not None:
+                return reclaimed
+            if loop.time() >= deadline:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A request with this Idempotency-Key is still in progress"
+                )
+            await asyncio.sleep(0.1)
+
+    async def _load_attempt(self, db: AsyncIOMotorClient, scoped_key: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """The attempt a completed key produced"""
+        attempt = await db.attempts.find_one({"_id": ObjectId(record["attempt_id"])})
+        if attempt is None:
+            raise HTTPException(status_code=404, detail="Attempt not found")
+        attempt["_id"] = str(attempt["_id"])
+        self.results.set(scoped_key, attempt)
+        return attempt
+
+
+idempotency_keys = IdempotencyStore()
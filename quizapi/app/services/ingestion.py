@@ -0,0 +1,161 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .attempts import write_attempts
+from ..utils.config import get_settings
+
+
+class IngestionQueueFull(Exception):
+    """Raised when an attempt cannot be queued within the enqueue timeout"""
+
+
+class AttemptIngestionQueue:
+    """Write-behind queue that group-commits scored attempts.
+
+    Submitters enqueue a scored attempt document and await a future that
+    resolves once it is durably written. A single flusher drains the queue
+    in batches of up to attempt_ingestion_batch_size, waiting at most
+    attempt_ingestion_max_latency_ms for a batch to fill, and commits each
+    batch with write_attempts (insert_many + one bulk_write of user stats).
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._db: Optional[AsyncIOMotorClient] = None
+        self._closing = False
+        self.batches_flushed = 0
+        self.attempts_flushed = 0
+        self.max_batch_size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.attempt_ingestion_enabled and self._task is not None and not self._closing
+
+    async def submit(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue an attempt document and wait until it has been written"""
+        if self._closing:
+            # Shutting down; the client retries against a worker that is still accepting
+            raise IngestionQueueFull()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(
+                self.queue.put((doc, future)),
+                timeout=self.settings.attempt_ingestion_enqueue_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            raise IngestionQueueFull()
+        return await future
+
+    async def _next_batch(self) -> Tuple[List[Tuple[Dict[str, Any], asyncio.Future]], bool]:
+        """Collect the next batch; the bool is True once the shutdown sentinel was seen"""
+        item = await self.queue.get()
+        if item is None:
+            return [], True
+
+        loop = asyncio.get_running_loop()
+        batch = [item]
+        deadline = loop.time() + self.settings.attempt_ingestion_max_latency_ms / 1000
+        while len(batch) < self.settings.attempt_ingestion_batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _flush(self, db: AsyncIOMotorClient, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        docs = [doc for doc, _ in batch]
+        try:
+            # A statistics warning is already logged; the attempts themselves are stored.
+            # Partial failures come back per document, so only a write whose outcome
+            # is unknown for the whole batch fails every submitter
+            errors, _ = await write_attempts(db, docs)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (doc, future), error in zip(batch, errors):
+            if future.done():
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(doc)
+
+        self.batches_flushed += 1
+        self.attempts_flushed += len(batch)
+        self.max_batch_size = max(self.max_batch_size, len(batch))
+
+    async def _run(self, db: AsyncIOMotorClient) -> None:
+        while True:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._flush(db, batch)
+            if stopping:
+                return
+
+    def start(self, db: AsyncIOMotorClient) -> None:
+        if not self.settings.attempt_ingestion_enabled or self._task is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.settings.attempt_ingestion_queue_size)
+        self._db = db
+        self._closing = False
+        self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self) -> None:
+        """Stop accepting attempts and flush everything already queued"""
+        if self._task is None:
+            return
+        self._closing = True
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+        await self._drain()
+
+    async def _drain(self) -> None:
+        """Flush attempts queued behind the sentinel by submitters that were waiting for room.
+
+        Each flush frees room, letting any still-blocked submitter enqueue,
+        so draining repeats until a pass finds the queue empty.
+        """
+        batch_size = self.settings.attempt_ingestion_batch_size
+        while True:
+            leftover = []
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is not None:
+                    leftover.append(item)
+            if not leftover:
+                return
+            for start in range(0, len(leftover), batch_size):
+                await self._flush(self._db, leftover[start:start + batch_size])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "batches_flushed": self.batches_flushed,
+            "attempts_flushed": self.attempts_flushed,
+            "average_batch_size": round(self.attempts_flushed / self.batches_flushed, 2) if self.batches_flushed else 0.0,
+            "max_batch_size": self.max_batch_size
+        }
+
+
+attempt_ingestion = AttemptIngestionQueue()
@@ -0,0 +1,285 @@
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ..utils.cache import TTLCache
+from ..utils.config import get_settings
+
+# Attempts without a recorded time lose ties to every timed attempt
+UNTIMED = 2 ** 31 - 1
+
+# Best first: highest score, then fastest, then whoever got there first, then by user_id like rank_key
+ENTRY_SORT = [("score", -1), ("time_key", 1), ("completed_at", 1), ("user_id", 1)]
+
+SNAPSHOT_RETRIES = 5
+
+ENTRY_FIELDS = {"_id": 0, "user_id": 1, "attempt_id": 1, "score": 1, "time_taken": 1, "time_key": 1, "completed_at": 1}
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    # Comparable with the naive UTC datetimes Mongo returns
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def rank_key(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Sorts entries best first, matching ENTRY_SORT with user_id as a final tie-breaker"""
+    return (-entry["score"], entry["time_key"], entry["completed_at"], entry["user_id"])
+
+
+def leaderboard_entry(attempt_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """A user's standing on a quiz as recorded by one attempt"""
+    time_taken = attempt_doc.get("time_taken")
+    return {
+        "_id": f"{attempt_doc['quiz_id']}:{attempt_doc['user_id']}",
+        "quiz_id": attempt_doc["quiz_id"],
+        "user_id": attempt_doc["user_id"],
+        "attempt_id": str(attempt_doc["_id"]),
+        "score": attempt_doc["score"],
+        "time_taken": time_taken,
+        "time_key": time_taken if time_taken is not None else UNTIMED,
+        "completed_at": _naive_utc(attempt_doc["completed_at"])
+    }
+
+
+def best_entry_update(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Pipeline update that keeps whichever of the stored and the new entry ranks higher.
+
+    Upserting against a missing document starts from {_id}, where $score is
+    missing and the new entry always wins.
+    """
+    better = {"$or": [
+        {"$gt": [entry["score"], {"$ifNull": ["$score", -1]}]},
+        {"$and": [{"$eq": [entry["score"], "$score"]}, {"$lt": [entry["time_key"], "$time_key"]}]},
+        {"$and": [
+            {"$eq": [entry["score"], "$score"]},
+            {"$eq": [entry["time_key"], "$time_key"]},
+            {"$lt": [entry["completed_at"], "$completed_at"]}
+        ]}
+    ]}
+    return [{"$replaceWith": {"$cond": [better, {"$literal": entry}, "$$ROOT"]}}]
+
+
+def best_entries_pipeline(quiz_id: str, match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Aggregation producing the leaderboard entry of each user's best attempt among match"""
+    return [
+        {"$match": match},
+        {"$set": {"time_key": {"$ifNull": ["$time_taken", UNTIMED]}}},
+        {"$sort": {"score": -1, "time_key": 1, "completed_at": 1}},
+        {"$group": {
+            "_id": "$user_id",
+            "attempt_id": {"$first": {"$toString": "$_id"}},
+            "score": {"$first": "$score"},
+            "time_taken": {"$first": "$time_taken"},
+            "time_key": {"$first": "$time_key"},
+            "completed_at": {"$first": "$completed_at"}
+        }},
+        {"$project": {
+            "_id": {"$concat": [quiz_id, ":", "$_id"]},
+            "quiz_id": {"$literal": quiz_id},
+            "user_id": "$_id",
+            "attempt_id": 1,
+            "score": 1,
+            "time_taken": 1,
+            "time_key": 1,
+            "completed_at": 1
+        }}
+    ]
+
+
+class QuizLeaderboard:
+    """One quiz's top entries, kept sorted so ranks are found by binary search"""
+
+    def __init__(self, entries: List[Dict[str, Any]], size: int):
+        self.size = size
+        self.entries = sorted(entries, key=rank_key)[:size]
+        self.keys = [rank_key(entry) for entry in self.entries]
+        self.by_user = {entry["user_id"]: entry for entry in self.entries}
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return self.entries[:limit]
+
+    def rank_of(self, user_id: str) -> Optional[int]:
+        """1-based rank if the user is on this list, in O(log size)"""
+        entry = self.by_user.get(user_id)
+        if entry is None:
+            return None
+        return bisect_left(self.keys, rank_key(entry)) + 1
+
+    def qualifies(self, entry: Dict[str, Any]) -> bool:
+        """Whether entry would make the list, or improve the user's place on it"""
+        current = self.by_user.get(entry["user_id"])
+        if current is not None:
+            return rank_key(entry) < rank_key(current)
+        return len(self.entries) < self.size or rank_key(entry) < self.keys[-1]
+
+
+class Leaderboards:
+    """Per-quiz leaderboards, updated as attempts are submitted.
+
+    Every user's best attempt per quiz is kept in leaderboard_entries. The
+    top leaderboard_size of them are persisted per quiz in the leaderboards
+    collection, rewritten with a version guard whenever a submission makes
+    the list. Each worker holds recently read lists in memory and reloads
+    them after its own submissions change them; other workers' changes show
+    up within leaderboard_cache_ttl_seconds.
+
+    Ranks on the list are found by binary search. Ranks further down are
+    an index-covered count over the (quiz_id, score, time_key,
+    completed_at, user_id) index: no documents are fetched and nothing is
+    sorted, but the count scans one key per entry ahead, so it is linear
+    in the rank rather than O(log n).
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.boards = TTLCache(
+            maxsize=self.settings.leaderboard_cache_size,
+            ttl=self.settings.leaderboard_cache_ttl_seconds
+        )
+
+    async def _top_entries(self, db: AsyncIOMotorClient, quiz_id: str) -> List[Dict[str, Any]]:
+        size = self.settings.leaderboard_size
+        cursor = db.leaderboard_entries.find({"quiz_id": quiz_id}, ENTRY_FIELDS).sort(ENTRY_SORT).limit(size)
+        return await cursor.to_list(size)
+
+    async def _save_snapshot(self, db: AsyncIOMotorClient, quiz_id: str) -> QuizLeaderboard:
+        """Persist the current top entries; a snapshot read before a concurrent save is retried"""
+        entries: List[Dict[str, Any]] = []
+        for _ in range(SNAPSHOT_RETRIES):
+            current = await db.leaderboards.find_one({"_id": quiz_id}, {"version": 1})
+            entries = await self._top_entries(db, quiz_id)
+            fields = {"entries": entries, "updated_at": datetime.now(timezone.utc)}
+            if current is None:
+                try:
+                    await db.leaderboards.insert_one({"_id": quiz_id, **fields, "version": 1})
+                    break
+                except DuplicateKeyError:
+                    continue
+            result = await db.leaderboards.update_one(
+                {"_id": quiz_id, "version": current["version"]},
+                {"$set": fields, "$inc": {"version": 1}}
+            )
+            if result.matched_count:
+                break
+
+        board = QuizLeaderboard(entries, self.settings.leaderboard_size)
+        self.boards.set(quiz_id, board)
+        return board
+
+    async def get(self, db: AsyncIOMotorClient, quiz_id: str) -> QuizLeaderboard:
+        board = self.boards.get(quiz_id)
+        if board is not None:
+            return board
+
+        snapshot = await db.leaderboards.find_one({"_id": quiz_id}, {"entries": 1})
+        if snapshot is None:
+            return await self._save_snapshot(db, quiz_id)
+        board = QuizLeaderboard(snapshot["entries"], self.settings.leaderboard_size)
+        self.boards.set(quiz_id, board)
+        return board
+
+    async def record(self, db: AsyncIOMotorClient, attempt_docs: List[Dict[str, Any]]) -> None:
+        """Fold stored attempts into their users' best entries and refresh the lists they make"""
+        best: Dict[str, Dict[str, Any]] = {}
+        for doc in attempt_docs:
+            entry = leaderboard_entry(doc)
+            current = best.get(entry["_id"])
+            if current is None or rank_key(entry) < rank_key(current):
+                best[entry["_id"]] = entry
+        if not best:
+            return
+
+        await db.leaderboard_entries.bulk_write(
+            [UpdateOne({"_id": entry_id}, best_entry_update(entry), upsert=True) for entry_id, entry in best.items()],
+            ordered=False
+        )
+
+        changed = set()
+        for entry in best.values():
+            board = await self.get(db, entry["quiz_id"])
+            if board.qualifies(entry):
+                changed.add(entry["quiz_id"])
+        for quiz_id in changed:
+            await self._save_snapshot(db, quiz_id)
+
+    async def top(self, db: AsyncIOMotorClient, quiz_id: str, limit: int) -> List[Dict[str, Any]]:
+        board = await self.get(db, quiz_id)
+        return [{**entry, "rank": rank} for rank, entry in enumerate(board.top(limit), start=1)]
+
+    async def rank(self, db: AsyncIOMotorClient, quiz_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's best entry with its rank, or None if they have not attempted the quiz"""
+        board = await self.get(db, quiz_id)
+        position = board.rank_of(user_id)
+        if position is not None:
+            return {**board.by_user[user_id], "rank": position}
+
+        entry = await db.leaderboard_entries.find_one({"_id": f"{quiz_id}:{user_id}"}, ENTRY_FIELDS)
+        if entry is None:
+            return None
+        ahead = await db.leaderboard_entries.count_documents({
+            "quiz_id": quiz_id,
+            "$or": [
+                {"score": {"$gt": entry["score"]}},
+                {"score": entry["score"], "time_key": {"$lt": entry["time_key"]}},
+                {"score": entry["score"], "time_key": entry["time_key"], "completed_at": {"$lt": entry["completed_at"]}},
+                # Exact ties fall back to user_id, as rank_key does on the list
+                {
+                    "score": entry["score"],
+                    "time_key": entry["time_key"],
+                    "completed_at": entry["completed_at"],
+                    "user_id": {"$lt": entry["user_id"]}
+                }
+            ]
+        })
+        return {**entry, "rank": ahead + 1}
+
+    async def rescored(self, db: AsyncIOMotorClient, quiz_id: str, attempt_docs: List[Dict[str, Any]]) -> None:
+        """Correct entries after attempts were rescored, without rebuilding the quiz's entries.
+
+        attempt_docs carry their new scores. Each affected user's best
+        attempt is recomputed; it replaces the stored entry only if that
+        entry still points at one of the rescored attempts, and is otherwise
+        offered like a new submission. An entry written meanwhile by a
+        concurrent submission is therefore kept whenever it ranks higher.
+        """
+        rescored_ids: Dict[str, List[str]] = {}
+        for doc in attempt_docs:
+            rescored_ids.setdefault(doc["user_id"], []).append(str(doc["_id"]))
+        if not rescored_ids:
+            return
+
+        match = {"quiz_id": quiz_id, "user_id": {"$in": list(rescored_ids)}}
+        operations = []
+        async for entry in db.attempts.aggregate(best_entries_pipeline(quiz_id, match)):
+            ids = rescored_ids[entry["user_id"]]
+            operations.append(UpdateOne(
+                {"_id": entry["_id"], "attempt_id": {"$in": ids}},
+                [{"$replaceWith": {"$literal": entry}}]
+            ))
+            operations.append(UpdateOne({"_id": entry["_id"]}, best_entry_update(entry), upsert=True))
+        if operations:
+            # Ordered, so each user's replacement lands before the comparison against it
+            await db.leaderboard_entries.bulk_write(operations, ordered=True)
+        await self._save_snapshot(db, quiz_id)
+
+    async def rebuild(self, db: AsyncIOMotorClient, quiz_id: str) -> None:
+        """Recompute a quiz's entries from its attempts, repairing them if they drifted"""
+        await db.leaderboard_entries.delete_many({"quiz_id": quiz_id})
+        pipeline = best_entries_pipeline(quiz_id, {"quiz_id": quiz_id})
+        pipeline.append({"$merge": {"into": "leaderboard_entries", "whenMatched": "replace", "whenNotMatched": "insert"}})
+        await db.attempts.aggregate(pipeline, allowDiskUse=True).to_list(None)
+        await self._save_snapshot(db, quiz_id)
+
+    async def delete(self, db: AsyncIOMotorClient, quiz_id: str) -> None:
+        await db.leaderboard_entries.delete_many({"quiz_id": quiz_id})
+        await db.leaderboards.delete_one({"_id": quiz_id})
+        self.boards.pop(quiz_id)
+
+
+leaderboards = Leaderboards()
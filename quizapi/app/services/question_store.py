@@ -0,0 +1,294 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+EMBEDDED = "embedded"
+COLLECTION = "collection"
+
+# Fields needed to compile answer keys, for both layouts
+ANSWER_KEY_QUIZ_FIELDS = {
+    "title": 1, "questions.options.is_correct": 1, "question_storage": 1, "question_set": 1, "question_layout": 1,
+    "removed_questions": 1
+}
+
+# Attempts at swapping in a question set when concurrent edits keep replacing it first
+SWAP_RETRIES = 5
+ANSWER_KEY_QUESTION_FIELDS = {"options.is_correct": 1}
+
+
+def uses_collection(quiz: Dict[str, Any]) -> bool:
+    """Whether the quiz keeps its questions in the questions collection instead of embedding them"""
+    return quiz.get("question_storage") == COLLECTION
+
+
+def question_docs(
+    quiz_id: str,
+    questions: Iterable[Dict[str, Any]],
+    question_set: Optional[str],
+    start: int = 0
+) -> List[Dict[str, Any]]:
+    return [
+        {**question, "quiz_id": quiz_id, "question_set": question_set, "position": start + i}
+        for i, question in enumerate(questions)
+    ]
+
+
+def set_filter(quiz: Dict[str, Any]) -> Dict[str, Any]:
+    """Matches the questions of the set the quiz currently points at.
+
+    Quizzes moved to the collection before sets existed have no
+    question_set, and None also matches their questions' missing field.
+    """
+    return {"quiz_id": str(quiz["_id"]), "question_set": quiz.get("question_set")}
+
+
+async def attach_questions(
+    db: AsyncIOMotorClient,
+    quizzes: List[Dict[str, Any]],
+    fields: Optional[Dict[str, int]] = None
+) -> None:
+    """Fill in the questions of collection-backed quizzes in place, with one query for all of them"""
+    current_sets = {str(quiz["_id"]): quiz.get("question_set") for quiz in quizzes if uses_collection(quiz)}
+    if not current_sets:
+        return
+
+    projection = {"_id": 0, "quiz_id": 1, "question_set": 1, **(fields or {"question_text": 1, "options": 1})}
+    by_quiz: Dict[str, List[Dict[str, Any]]] = {quiz_id: [] for quiz_id in current_sets}
+    cursor = db.questions.find(
+        {"quiz_id": {"$in": list(current_sets)}},
+        projection
+    ).sort([("quiz_id", 1), ("position", 1)])
+    async for question in cursor:
+        quiz_id = question.pop("quiz_id")
+        # A set being written by a concurrent replace, or one about to be deleted
+        if question.pop("question_set", None) != current_sets[quiz_id]:
+            continue
+        by_quiz[quiz_id].append(question)
+
+    for quiz in quizzes:
+        if uses_collection(quiz):
+            quiz["questions"] = by_quiz[str(quiz["_id"])]
+
+
+async def load_quiz(db: AsyncIOMotorClient, quiz_id: str) -> Optional[Dict[str, Any]]:
+    """The full quiz document with its questions, whichever layout it uses"""
+    quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)})
+    if quiz is not None:
+        await attach_questions(db, [quiz])
+    return quiz
+
+
+async def load_answer_sources(db: AsyncIOMotorClient, quiz_ids: List[str]) -> List[Dict[str, Any]]:
+    """Quizzes reduced to the title and option flags AnswerKey.from_quiz needs"""
+    quizzes = await db.quizzes.find(
+        {"_id": {"$in": [ObjectId(quiz_id) for quiz_id in quiz_ids]}},
+        ANSWER_KEY_QUIZ_FIELDS
+    ).to_list(len(quiz_ids))
+    await attach_questions(db, quizzes, ANSWER_KEY_QUESTION_FIELDS)
+    return quizzes
+
+
+async def load_page(
+    db: AsyncIOMotorClient,
+    quiz_id: str,
+    offset: int,
+    limit: int,
+    version: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """Read only questions [offset, offset + limit) along with the quiz's version and question_count"""
+    match: Dict[str, Any] = {"_id": ObjectId(quiz_id)}
+    if version is not None:
+        match["version"] = version if version else {"$in": [0, None]}
+
+    pipeline = [
+        {"$match": match},
+        {"$project": {
+            "version": {"$ifNull": ["$version", 0]},
+            "question_storage": 1,
+            "question_set": 1,
+            "question_count": {"$ifNull": ["$question_count", {"$size": {"$ifNull": ["$questions", []]}}]},
+            "questions": {"$slice": [{"$ifNull": ["$questions", []]}, offset, limit]}
+        }}
+    ]
+    pages = await db.quizzes.aggregate(pipeline).to_list(1)
+    if not pages:
+        return None
+
+    page = pages[0]
+    if uses_collection(page):
+        page["questions"] = await db.questions.find(
+            {**set_filter(page), "position": {"$gte": offset, "$lt": offset + limit}},
+            {"_id": 0, "question_text": 1, "options": 1}
+        ).sort("position", 1).to_list(limit)
+    return page
+
+
+async def write_question_set(db: AsyncIOMotorClient, quiz_id: str, questions: List[Dict[str, Any]]) -> str:
+    """Store questions as a new set that no quiz reads yet; returns its id"""
+    question_set = str(ObjectId())
+    if questions:
+        await db.questions.insert_many(question_docs(quiz_id, questions, question_set))
+    return question_set
+
+
+async def replace_questions(
+    db: AsyncIOMotorClient,
+    quiz_filter: Dict[str, Any],
+    questions: List[Dict[str, Any]],
+    update: Dict[str, Any],
+    projection: Optional[Dict[str, int]] = None
+) -> Optional[Dict[str, Any]]:
+    """Write questions as a new set, then apply update to the quiz and point it at that set.
+
+    Readers see either the old set or the new one, never a partial one.
+    The set the quiz pointed at before is deleted afterwards. Returns the
+    quiz as it was before (question_set plus projection), or None if
+    quiz_filter matched nothing (the new set is deleted again).
+    """
+    quiz_id = str(quiz_filter["_id"])
+    question_set = await write_question_set(db, quiz_id, questions)
+    previous = await db.quizzes.find_one_and_update(
+        quiz_filter,
+        {**update, "$set": {**update.get("$set", {}), "question_set": question_set}},
+        projection={**(projection or {}), "question_set": 1}
+    )
+    if previous is None:
+        await db.questions.delete_many({"quiz_id": quiz_id, "question_set": question_set})
+        return None
+    await db.questions.delete_many(set_filter(previous))
+    return previous
+
+
+async def delete_questions(db: AsyncIOMotorClient, quiz_id: str) -> None:
+    await db.questions.delete_many({"quiz_id": quiz_id})
+
+
+async def set_question(db: AsyncIOMotorClient, quiz: Dict[str, Any], index: int, question: Dict[str, Any]) -> bool:
+    """Replace the question at index; False if there is none"""
+    if uses_collection(quiz):
+        result = await db.questions.update_one({**set_filter(quiz), "position": index}, {"$set": question})
+        if result.matched_count == 0:
+            return False
+        await db.quizzes.update_one({"_id": quiz["_id"]}, {"$inc": {"version": 1}})
+        return True
+
+    result = await db.quizzes.update_one(
+        {"_id": quiz["_id"], f"questions.{index}": {"$exists": True}},
+        {"$set": {f"questions.{index}": question}, "$inc": {"version": 1}}
+    )
+    return result.matched_count > 0
+
+
+async def add_question(db: AsyncIOMotorClient, quiz: Dict[str, Any], question: Dict[str, Any]) -> int:
+    """Append a question and return its index"""
+    if uses_collection(quiz):
+        # Reserve the position first so concurrent appends never share one
+        reserved = await db.quizzes.find_one_and_update(
+            {"_id": quiz["_id"]},
+            {"$inc": {"question_count": 1, "version": 1}},
+            projection={"question_count": 1, "question_set": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        index = reserved["question_count"] - 1
+        await db.questions.insert_one(question_docs(str(quiz["_id"]), [question], reserved.get("question_set"), start=index)[0])
+        return index
+
+    updated = await db.quizzes.find_one_and_update(
+        {"_id": quiz["_id"]},
+        [{"$set": {
+            "questions": {"$concatArrays": [{"$ifNull": ["$questions", []]}, [{"$literal": question}]]},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+        }}, {"$set": {"question_count": {"$size": "$questions"}}}],
+        projection={"question_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return updated["question_count"] - 1
+
+
+async def remove_question(db: AsyncIOMotorClient, quiz: Dict[str, Any], index: int) -> Optional[List[int]]:
+    """Remove the question at index and shift later questions down.
+
+    Every removal bumps the quiz's question_layout and appends index to its
+    removed_questions, since answers recorded against the old indexes no
+    longer line up. Returns the updated removed_questions, or None if there
+    is no question at index.
+    """
+    if uses_collection(quiz):
+        return await _remove_collection_question(db, quiz["_id"], index)
+
+    # $slice needs a positive count, so the head is left out when removing the first question
+    kept = [{"$slice": ["$questions", index]}] if index > 0 else []
+    kept.append({"$slice": ["$questions", index + 1, {"$max": [1, {"$size": "$questions"}]}]})
+    updated = await db.quizzes.find_one_and_update(
+        {"_id": quiz["_id"], f"questions.{index}": {"$exists": True}},
+        [{"$set": {
+            "questions": {"$concatArrays": kept},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]},
+            "question_layout": {"$add": [{"$ifNull": ["$question_layout", 0]}, 1]},
+            "removed_questions": {"$concatArrays": [{"$ifNull": ["$removed_questions", []]}, [index]]}
+        }}, {"$set": {"question_count": {"$size": "$questions"}}}],
+        projection={"removed_questions": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return updated["removed_questions"] if updated is not None else None
+
+
+async def _remove_collection_question(db: AsyncIOMotorClient, quiz_oid: ObjectId, index: int) -> Optional[List[int]]:
+    # Deleting in place and then shifting positions would show readers a gap, so the
+    # remaining questions are written as a new set and swapped in like replace_questions
+    for _ in range(SWAP_RETRIES):
+        quiz = await db.quizzes.find_one({"_id": quiz_oid}, {"question_set": 1})
+        if quiz is None:
+            return None
+        questions = await db.questions.find(set_filter(quiz), {"_id": 0, "quiz_id": 0, "question_set": 0}).sort("position", 1).to_list(None)
+        if index >= len(questions):
+            return None
+
+        kept = [{k: v for k, v in question.items() if k != "position"} for question in questions]
+        del kept[index]
+        previous = await replace_questions(
+            db,
+            {"_id": quiz_oid, "question_set": quiz.get("question_set")},
+            kept,
+            {
+                "$set": {"question_count": len(kept)},
+                "$inc": {"version": 1, "question_layout": 1},
+                "$push": {"removed_questions": index}
+            },
+            projection={"removed_questions": 1}
+        )
+        if previous is not None:
+            return previous.get("removed_questions", []) + [index]
+    raise RuntimeError(f"Quiz {quiz_oid} kept changing while removing question {index}")
+
+
+async def migrate_quiz(db: AsyncIOMotorClient, quiz_id: str, layout: str) -> bool:
+    """Move one quiz's questions to layout; False if it is already there or changed meanwhile"""
+    quiz = await load_quiz(db, quiz_id)
+    current = COLLECTION if quiz is not None and uses_collection(quiz) else EMBEDDED
+    if quiz is None or current == layout:
+        return False
+
+    questions = quiz.get("questions", [])
+    version = quiz.get("version", 0)
+    guard = {"_id": quiz["_id"], "version": version if version else {"$in": [0, None]}}
+
+    if layout == COLLECTION:
+        previous = await replace_questions(db, guard, questions, {
+            "$set": {"question_storage": COLLECTION, "question_count": len(questions)},
+            "$unset": {"questions": ""},
+            "$inc": {"version": 1}
+        })
+        return previous is not None
+
+    result = await db.quizzes.update_one(guard, {
+        "$set": {"question_storage": EMBEDDED, "questions": questions, "question_count": len(questions)},
+        "$unset": {"question_set": ""},
+        "$inc": {"version": 1}
+    })
+    if result.matched_count == 0:
+        return False
+    await delete_questions(db, quiz_id)
+    return True
@@ -0,0 +1,187 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+from .question_store import load_quiz
+from ..utils.cache import TTLCache
+from ..utils.config import get_settings
+from ..utils.periodic import PeriodicTask
+from ..utils.serialization import quiz_serializer
+
+# Returned by servers that cannot open change streams (standalone mongod)
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+
+
+class QuizCache:
+    """Per-worker read-through cache of quiz documents and their serialized JSON.
+
+    Entries are weighed by the size of their JSON body and evicted LRU-first
+    once quiz_cache_max_bytes is exceeded. Every worker tails a change stream
+    on the quizzes collection and drops the entries it reports. Without a
+    replica set it falls back to polling the quiz_invalidations collection,
+    which invalidate() writes to. Either way, entries never outlive
+    quiz_cache_ttl_seconds.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.quizzes = TTLCache(
+            maxsize=self.settings.quiz_cache_max_bytes,
+            ttl=self.settings.quiz_cache_ttl_seconds
+        )
+        self.mode = "stopped"
+        self.last_seen: Optional[datetime] = None
+        self._listeners: List[Callable[[str], None]] = []
+        self._watcher: Optional[asyncio.Task] = None
+        self._poller: Optional[PeriodicTask] = None
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Call listener(quiz_id) whenever a quiz is evicted because it changed"""
+        self._listeners.append(listener)
+
+    async def get_entry(self, db: AsyncIOMotorClient, quiz_id: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """Return (document, JSON body) as cached together, or None if the quiz does not exist"""
+        entry = self.quizzes.get(quiz_id)
+        if entry is not None:
+            return entry
+
+        quiz = await load_quiz(db, quiz_id)
+        if quiz is None:
+            return None
+
+        quiz["_id"] = str(quiz["_id"])
+        body = quiz_serializer.dump(quiz)
+        entry = (quiz, body)
+        self.quizzes.set(quiz_id, entry, weight=len(body))
+        return entry
+
+    async def get(self, db: AsyncIOMotorClient, quiz_id: str) -> Optional[Dict[str, Any]]:
+        """Return the quiz document (shared, do not mutate), or None if it does not exist"""
+        entry = await self.get_entry(db, quiz_id)
+        return entry[0] if entry is not None else None
+
+    async def get_json(self, db: AsyncIOMotorClient, quiz_id: str) -> Optional[bytes]:
+        """Return the quiz serialized as the Quiz schema, or None if it does not exist"""
+        entry = await self.get_entry(db, quiz_id)
+        return entry[1] if entry is not None else None
+
+    def peek(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached document without loading it on a miss"""
+        entry = self.quizzes.get(quiz_id)
+        return entry[0] if entry is not None else None
+
+    async def get_version(self, db: AsyncIOMotorClient, quiz_id: str) -> Optional[int]:
+        """Return the quiz's content version, reading only that field on a cache miss"""
+        entry = self.quizzes.get(quiz_id)
+        if entry is not None:
+            return entry[0].get("version", 0)
+
+        quiz = await db.quizzes.find_one({"_id": ObjectId(quiz_id)}, {"version": 1})
+        return quiz.get("version", 0) if quiz is not None else None
+
+    def evict(self, quiz_id: str) -> None:
+        self.quizzes.pop(quiz_id)
+        for listener in self._listeners:
+            listener(quiz_id)
+
+    def clear(self) -> None:
+        self.quizzes.clear()
+
+    async def invalidate(self, db: AsyncIOMotorClient, quiz_id: str) -> None:
+        """Evict a quiz on this worker and signal workers without change streams to do the same"""
+        self.evict(quiz_id)
+        await db.quiz_invalidations.insert_one({
+            "quiz_id": quiz_id,
+            "invalidated_at": datetime.now(timezone.utc)
+        })
+
+    async def poll(self, db: AsyncIOMotorClient) -> None:
+        """Apply invalidations recorded by other workers since the last poll"""
+        now = datetime.now(timezone.utc)
+        if self.last_seen is None:
+            since = now - timedelta(seconds=self.settings.quiz_cache_ttl_seconds)
+        else:
+            # Overlap the window a little to tolerate clock skew between workers
+            since = self.last_seen - timedelta(seconds=5)
+
+        cursor = db.quiz_invalidations.find({"invalidated_at": {"$gte": since}})
+        async for doc in cursor:
+            self.evict(doc["quiz_id"])
+        self.last_seen = now
+
+    def _apply_change(self, change: Dict[str, Any]) -> None:
+        document_key = change.get("documentKey")
+        if document_key is not None:
+            self.evict(str(document_key["_id"]))
+        else:
+            # drop, rename or invalidate events: nothing cached can be trusted
+            self.clear()
+
+    async def _watch(self, db: AsyncIOMotorClient) -> None:
+        while True:
+            try:
+                async with db.quizzes.watch() as stream:
+                    # try_next opens the stream; anything cached before that may have been missed
+                    change = await stream.try_next()
+                    self.mode = "change_stream"
+                    self.clear()
+                    if change is not None:
+                        self._apply_change(change)
+                    async for change in stream:
+                        self._apply_change(change)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    print("Quiz cache: change streams unavailable, polling quiz_invalidations instead")
+                    self._start_polling(db)
+                    return
+                print(f"Quiz cache change stream error: {e}")
+            except Exception as e:
+                print(f"Quiz cache change stream error: {e}")
+
+            # Changes may be missed until the stream is reopened
+            self.mode = "reconnecting"
+            self.clear()
+            await asyncio.sleep(self.settings.quiz_invalidation_poll_seconds)
+
+    def _start_polling(self, db: AsyncIOMotorClient) -> None:
+        self.mode = "polling"
+        if self._poller is None:
+            self._poller = PeriodicTask(
+                "Quiz cache invalidation poll",
+                self.settings.quiz_invalidation_poll_seconds,
+                lambda: self.poll(db)
+            )
+        self._poller.start()
+
+    def start(self, db: AsyncIOMotorClient) -> None:
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch(db))
+
+    async def stop(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        if self._poller is not None:
+            await self._poller.stop()
+        self.mode = "stopped"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "entries": len(self.quizzes),
+            "bytes": self.quizzes.weight,
+            "max_bytes": self.quizzes.maxsize
+        }
+
+
+quiz_cache = QuizCache()
@@ -0,0 +1,254 @@
+import asyncio
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from .question_store import load_answer_sources
+from .attempts import remap_removed_questions
+from .scoring import AnswerKey
+from .leaderboards import leaderboards
+from .user_stats import daily_delta_updates, day_start, refresh_daily_extremes, score_delta_update
+from ..auth.user_cache import user_cache
+from ..utils.config import get_settings
+
+# Selected-option masks use int64, so option indices must stay below this
+MAX_VECTOR_OPTIONS = 63
+
+
+def selected_masks(selected: List[List[int]], option_counts: np.ndarray) -> np.ndarray:
+    """Bitmask of each answer's selected options, -1 where one is out of range, as option_mask computes.
+
+    The selections are flattened into one array and OR-ed together per
+    answer with bitwise_or.reduceat; empty selections keep a mask of 0.
+    """
+    lengths = np.fromiter((len(options) for options in selected), dtype=np.int64, count=len(selected))
+    masks = np.zeros(len(selected), dtype=np.int64)
+    if not lengths.any():
+        return masks
+
+    flat = np.fromiter((option for options in selected for option in options), dtype=np.int64, count=int(lengths.sum()))
+    limits = np.repeat(option_counts, lengths)
+    invalid = (flat < 0) | (flat >= limits)
+    bits = np.left_shift(np.int64(1), np.clip(flat, 0, MAX_VECTOR_OPTIONS - 1))
+
+    # Segments start at each non-empty answer's offset; empty answers in between add nothing
+    nonempty = lengths > 0
+    starts = (np.cumsum(lengths) - lengths)[nonempty]
+    masks[nonempty] = np.bitwise_or.reduceat(bits, starts)
+    masks[nonempty] = np.where(np.logical_or.reduceat(invalid, starts), -1, masks[nonempty])
+    return masks
+
+
+def score_chunk(answer_key: AnswerKey, attempts: List[Dict[str, Any]]) -> np.ndarray:
+    """Score a chunk of stored attempts against answer_key in one vectorized pass.
+
+    Every stored answer becomes one row of (attempt row, question index,
+    selected-option bitmask); matches are counted per attempt with bincount.
+    """
+    rows: List[int] = []
+    questions: List[int] = []
+    selected: List[List[int]] = []
+    question_count = answer_key.question_count
+
+    for row, attempt in enumerate(attempts):
+        for answer in attempt.get("answers", []):
+            question_index = answer.get("question_index", -1)
+            if 0 <= question_index < question_count:
+                rows.append(row)
+                questions.append(question_index)
+                selected.append(answer.get("selected_options", []))
+
+    correct_counts = np.zeros(len(attempts), dtype=np.int64)
+    if rows:
+        question_indexes = np.asarray(questions, dtype=np.int64)
+        option_counts = np.asarray(answer_key.option_counts, dtype=np.int64)[question_indexes]
+        masks = np.asarray(answer_key.masks, dtype=np.int64)
+        matches = masks[question_indexes] == selected_masks(selected, option_counts)
+        correct_counts = np.bincount(np.asarray(rows, dtype=np.int64)[matches], minlength=len(attempts))
+
+    # Score each distinct count once with Python rounding so results match AnswerKey.score exactly
+    score_table = np.array([
+        round(count / question_count * 100, 2) if question_count > 0 else 0
+        for count in range(int(correct_counts.max(initial=0)) + 1)
+    ], dtype=np.float64)
+    return score_table[correct_counts]
+
+
+class RescoreJobs:
+    """Background jobs that rescore every attempt of a quiz after its answer key changed.
+
+    Attempts are streamed in chunks of rescore_chunk_size, so memory stays
+    bounded. Each changed chunk is written back with bulk_write, along with
+    the embedded quiz_attempts records. Aggregates are then shifted by the
+    chunk's score deltas (users' score_sum, the daily rollup) and affected
+    leaderboard entries are corrected, all in place, so submissions landing
+    while the job runs are never overwritten. Progress is recorded in the
+    rescore_jobs collection.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def start(self, db: AsyncIOMotorClient, quiz_id: str) -> str:
+        """Record a pending job and rescore in the background; returns the job id"""
+        job_id = uuid.uuid4().hex
+        await db.rescore_jobs.insert_one({
+            "_id": job_id,
+            "quiz_id": quiz_id,
+            "status": "pending",
+            "total": None,
+            "processed": 0,
+            "changed": 0,
+            "users_affected": 0,
+            "created_at": datetime.now(timezone.utc)
+        })
+        self._tasks[job_id] = asyncio.create_task(self._run(db, job_id, quiz_id))
+        self._tasks[job_id].add_done_callback(lambda _: self._tasks.pop(job_id, None))
+        return job_id
+
+    async def get(self, db: AsyncIOMotorClient, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await db.rescore_jobs.find_one({"_id": job_id})
+        if job is not None:
+            job["id"] = job.pop("_id")
+        return job
+
+    async def _run(self, db: AsyncIOMotorClient, job_id: str, quiz_id: str) -> None:
+        try:
+            quizzes = await load_answer_sources(db, [quiz_id])
+            if not quizzes:
+                raise ValueError("Quiz not found")
+            answer_key = AnswerKey.from_quiz(quizzes[0])
+
+            # Attempts written at an older layout after the removal's own remap are brought in line first
+            await remap_removed_questions(db, quiz_id, quizzes[0].get("removed_questions", []))
+
+            # Attempts recorded at another layout answered questions at different indexes
+            layout = answer_key.layout
+            query = {"quiz_id": quiz_id, "question_layout": layout if layout else {"$in": [0, None]}}
+            total = await db.attempts.count_documents(query)
+            await db.rescore_jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "running", "total": total, "started_at": datetime.now(timezone.utc)}}
+            )
+
+            processed, changed = 0, 0
+            affected_users: Set[str] = set()
+            chunk_size = self.settings.rescore_chunk_size
+            cursor = db.attempts.find(
+                query,
+                {"answers": 1, "score": 1, "user_id": 1, "completed_at": 1, "time_taken": 1}
+            ).batch_size(chunk_size)
+
+            chunk: List[Dict[str, Any]] = []
+            async for attempt in cursor:
+                chunk.append(attempt)
+                if len(chunk) >= chunk_size:
+                    changed += await self._rescore_chunk(db, job_id, quiz_id, answer_key, chunk, affected_users)
+                    processed += len(chunk)
+                    chunk = []
+                    await db.rescore_jobs.update_one(
+                        {"_id": job_id},
+                        {"$set": {"processed": processed, "changed": changed}}
+                    )
+            if chunk:
+                changed += await self._rescore_chunk(db, job_id, quiz_id, answer_key, chunk, affected_users)
+                processed += len(chunk)
+
+            await db.rescore_jobs.update_one(
+                {"_id": job_id},
+                {"$set": {
+                    "status": "completed",
+                    "processed": processed,
+                    "changed": changed,
+                    "users_affected": len(affected_users),
+                    "finished_at": datetime.now(timezone.utc)
+                }}
+            )
+        except Exception as e:
+            print(f"Rescore job {job_id} failed: {e}")
+            await db.rescore_jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.now(timezone.utc)}}
+            )
+
+    async def _rescore_chunk(
+        self,
+        db: AsyncIOMotorClient,
+        job_id: str,
+        quiz_id: str,
+        answer_key: AnswerKey,
+        chunk: List[Dict[str, Any]],
+        affected_users: Set[str]
+    ) -> int:
+        if max(answer_key.option_counts, default=0) > MAX_VECTOR_OPTIONS:
+            new_scores = [
+                answer_key.score(
+                    (answer.get("question_index", -1), answer.get("selected_options", []))
+                    for answer in attempt.get("answers", [])
+                )[1]
+                for attempt in chunk
+            ]
+        else:
+            new_scores = score_chunk(answer_key, chunk).tolist()
+
+        rescored = [
+            (attempt, new_score) for attempt, new_score in zip(chunk, new_scores)
+            if abs(attempt.get("score", 0) - new_score) >= 1e-9
+        ]
+        if not rescored:
+            return 0
+
+        # Written only over the score that was read, so each applied change has a known delta
+        result = await db.attempts.bulk_write([
+            UpdateOne(
+                {"_id": attempt["_id"], "score": attempt.get("score")},
+                {"$set": {"score": new_score, "rescored_by": job_id}}
+            )
+            for attempt, new_score in rescored
+        ], ordered=False)
+        if result.matched_count < len(rescored):
+            # Another job rescored some of them first; keep only the ones this job wrote
+            ours = {doc["_id"] async for doc in db.attempts.find(
+                {"_id": {"$in": [attempt["_id"] for attempt, _ in rescored]}, "rescored_by": job_id},
+                {"_id": 1}
+            )}
+            rescored = [(attempt, new_score) for attempt, new_score in rescored if attempt["_id"] in ours]
+            if not rescored:
+                return 0
+
+        user_deltas: Dict[str, float] = defaultdict(float)
+        day_deltas: Dict[Tuple[str, datetime], float] = defaultdict(float)
+        user_updates = []
+        for attempt, new_score in rescored:
+            delta = new_score - attempt.get("score", 0)
+            user_deltas[attempt["user_id"]] += delta
+            day_deltas[(attempt["user_id"], day_start(attempt["completed_at"]))] += delta
+            user_updates.append(UpdateOne(
+                {"_id": ObjectId(attempt["user_id"])},
+                {"$set": {"quiz_attempts.$[recent].score": new_score}, "$inc": {"version": 1}},
+                array_filters=[{"recent.attempt_id": str(attempt["_id"])}]
+            ))
+        user_updates += [
+            UpdateOne({"_id": ObjectId(user_id)}, score_delta_update(delta))
+            for user_id, delta in user_deltas.items()
+        ]
+
+        await db.users.bulk_write(user_updates, ordered=False)
+        for user_id in user_deltas:
+            user_cache.evict(user_id)
+        affected_users.update(user_deltas)
+
+        await db.user_daily_stats.bulk_write(daily_delta_updates(day_deltas), ordered=False)
+        await refresh_daily_extremes(db, list(day_deltas))
+        await leaderboards.rescored(db, quiz_id, [{**attempt, "score": new_score} for attempt, new_score in rescored])
+        return len(rescored)
+
+
+rescore_jobs = RescoreJobs()
@@ -0,0 +1,118 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .question_store import load_answer_sources
+from .quiz_cache import quiz_cache
+from ..utils.cache import TTLCache
+from ..utils.config import get_settings
+
+
+def option_mask(selected_options: Iterable[int], option_count: int) -> int:
+    """Bitmask of selected options, or -1 when any index is out of range"""
+    mask = 0
+    for option in selected_options:
+        if option < 0 or option >= option_count:
+            return -1
+        mask |= 1 << option
+    return mask
+
+
+class AnswerKey:
+    """Compiled answer key of a quiz: one bitmask of correct options per question.
+
+    layout is the quiz's question_layout, which counts removals that shifted
+    question indexes; attempts record it so their answers can be remapped.
+    """
+
+    __slots__ = ("masks", "option_counts", "question_count", "title", "layout")
+
+    def __init__(self, masks: Sequence[int], option_counts: Sequence[int], title: str, layout: int = 0):
+        self.masks = tuple(masks)
+        self.option_counts = tuple(option_counts)
+        self.question_count = len(self.masks)
+        self.title = title
+        self.layout = layout
+
+    @classmethod
+    def from_quiz(cls, quiz: dict) -> "AnswerKey":
+        masks: List[int] = []
+        option_counts: List[int] = []
+        for question in quiz.get("questions", []):
+            options = question.get("options", [])
+            masks.append(sum(1 << i for i, opt in enumerate(options) if opt.get("is_correct")))
+            option_counts.append(len(options))
+        return cls(masks, option_counts, quiz.get("title", ""), quiz.get("question_layout", 0))
+
+    def correct_count(self, answers: Iterable[Tuple[int, Iterable[int]]]) -> int:
+        """Count (question_index, selected_options) pairs that match the key exactly"""
+        masks = self.masks
+        option_counts = self.option_counts
+        count = 0
+        for question_index, selected_options in answers:
+            if 0 <= question_index < self.question_count:
+                if option_mask(selected_options, option_counts[question_index]) == masks[question_index]:
+                    count += 1
+        return count
+
+    def score(self, answers: Iterable[Tuple[int, Iterable[int]]]) -> Tuple[int, float]:
+        """Return (correct_count, percentage score rounded to 2 places)"""
+        correct = self.correct_count(answers)
+        score = (correct / self.question_count * 100) if self.question_count > 0 else 0
+        return correct, round(score, 2)
+
+
+class AnswerKeyCache:
+    """Per-worker cache of compiled answer keys keyed by quiz id.
+
+    Single lookups compile from the quiz cache, and keys are evicted whenever
+    the quiz cache reports that their quiz changed.
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.keys = TTLCache(
+            maxsize=self.settings.answer_key_cache_size,
+            ttl=self.settings.answer_key_cache_ttl_seconds
+        )
+
+    async def get(self, db: AsyncIOMotorClient, quiz_id: str) -> Optional[AnswerKey]:
+        key = self.keys.get(quiz_id)
+        if key is not None:
+            return key
+
+        quiz = await quiz_cache.get(db, quiz_id)
+        if quiz is None:
+            return None
+
+        key = AnswerKey.from_quiz(quiz)
+        self.keys.set(quiz_id, key)
+        return key
+
+    async def get_many(self, db: AsyncIOMotorClient, quiz_ids: Iterable[str]) -> Dict[str, AnswerKey]:
+        """Resolve several answer keys, fetching all cache misses in a single query"""
+        found: Dict[str, AnswerKey] = {}
+        missing: List[str] = []
+        for quiz_id in set(quiz_ids):
+            key = self.keys.get(quiz_id)
+            if key is not None:
+                found[quiz_id] = key
+            elif ObjectId.is_valid(quiz_id):
+                missing.append(quiz_id)
+
+        if missing:
+            for quiz in await load_answer_sources(db, missing):
+                quiz_id = str(quiz["_id"])
+                key = AnswerKey.from_quiz(quiz)
+                self.keys.set(quiz_id, key)
+                found[quiz_id] = key
+
+        return found
+
+    def invalidate(self, quiz_id: str) -> None:
+        self.keys.pop(quiz_id)
+
+
+answer_keys = AnswerKeyCache()
+quiz_cache.add_listener(answer_keys.invalidate)
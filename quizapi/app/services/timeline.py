@@ -0,0 +1,193 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+DAY = "day"
+WEEK = "week"
+MONTH = "month"
+
+BUCKETS = "buckets"
+LTTB = "lttb"
+
+
+def period_start(day: datetime, granularity: str) -> datetime:
+    """First day of the day, ISO week (Monday) or month that day falls in"""
+    if granularity == WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == MONTH:
+        return day.replace(day=1)
+    return day
+
+
+class Bucket:
+    """Running count, sum, min and max of the scores in one period; buckets merge exactly"""
+
+    __slots__ = ("start", "count", "score_sum", "min_score", "max_score", "seconds")
+
+    def __init__(self, start: datetime):
+        self.start = start
+        self.count = 0
+        self.score_sum = 0.0
+        self.min_score = math.inf
+        self.max_score = -math.inf
+        self.seconds = 0
+
+    def add(self, count: int, score_sum: float, min_score: float, max_score: float, seconds: int = 0) -> None:
+        self.count += count
+        self.score_sum += score_sum
+        self.min_score = min(self.min_score, min_score)
+        self.max_score = max(self.max_score, max_score)
+        self.seconds += seconds
+
+    def merge(self, other: "Bucket") -> None:
+        self.add(other.count, other.score_sum, other.min_score, other.max_score, other.seconds)
+
+    def point(self) -> Dict[str, Any]:
+        return {
+            "date": self.start.isoformat(),
+            "score": round(self.score_sum / self.count, 2),
+            "min": self.min_score,
+            "max": self.max_score,
+            "attempts": self.count
+        }
+
+
+async def period_buckets(db: AsyncIOMotorClient, user_id: str, granularity: str = DAY) -> List[Bucket]:
+    """One bucket per day, week or month with attempts, folded from the daily rollup as it streams in"""
+    buckets: List[Bucket] = []
+    days = db.user_daily_stats.find(
+        {"user_id": user_id},
+        {"_id": 0, "day": 1, "count": 1, "score_sum": 1, "min_score": 1, "best_score": 1, "seconds": 1}
+    ).sort("day", 1)
+    async for day in days:
+        start = period_start(day["day"], granularity)
+        if not buckets or buckets[-1].start != start:
+            buckets.append(Bucket(start))
+        mean = day["score_sum"] / day["count"]
+        buckets[-1].add(day["count"], day["score_sum"], day.get("min_score", mean), day["best_score"], day.get("seconds", 0))
+    return buckets
+
+
+def downsample_buckets(buckets: List[Bucket], points: int) -> List[Bucket]:
+    """Merge runs of adjacent buckets so that at most points remain"""
+    if len(buckets) <= points:
+        return buckets
+    size = math.ceil(len(buckets) / points)
+    merged = []
+    for i in range(0, len(buckets), size):
+        bucket = Bucket(buckets[i].start)
+        for other in buckets[i:i + size]:
+            bucket.merge(other)
+        merged.append(bucket)
+    return merged
+
+
+class Point(NamedTuple):
+    x: float
+    y: float
+    data: Dict[str, Any]
+
+
+def _average(points: List[Point]) -> Point:
+    return Point(sum(p.x for p in points) / len(points), sum(p.y for p in points) / len(points), {})
+
+
+def _largest_triangle(a: Point, bucket: List[Point], c: Point) -> Point:
+    """The point of bucket spanning the largest triangle with a and c"""
+    return max(bucket, key=lambda b: abs((a.x - c.x) * (b.y - a.y) - (a.x - b.x) * (c.y - a.y)))
+
+
+class LTTBReducer:
+    """Largest-Triangle-Three-Buckets downsampling over points fed one at a time in x order.
+
+    Bucket boundaries follow from the expected total, so only the bucket
+    being filled and the one waiting for its successor's average are held,
+    never the whole series. The first and last points are always kept; if
+    the total was an estimate, surplus points land in the final bucket.
+    """
+
+    def __init__(self, total: int, threshold: int):
+        self.every = max(total - 2, 1) / (threshold - 2)
+        self.last_bucket = threshold - 3
+        self.selected: List[Point] = []
+        self.seen = 0
+        self.held: Optional[Point] = None  # withheld until the next point shows it was not the last
+        self.bucket = 0
+        self.current: List[Point] = []
+        self.pending: Optional[List[Point]] = None
+
+    def add(self, point: Point) -> None:
+        if self.seen == 0:
+            self.selected.append(point)
+        else:
+            if self.held is not None:
+                self._place(self.held, self.seen - 1)
+            self.held = point
+        self.seen += 1
+
+    def _place(self, point: Point, index: int) -> None:
+        # Bucket i holds indices floor(i * every) + 1 up to floor((i + 1) * every)
+        bucket = min(math.ceil(index / self.every) - 1, self.last_bucket)
+        if bucket != self.bucket and self.current:
+            self._close()
+        self.bucket = bucket
+        self.current.append(point)
+
+    def _close(self) -> None:
+        if self.pending is not None:
+            self.selected.append(_largest_triangle(self.selected[-1], self.pending, _average(self.current)))
+        self.pending, self.current = self.current, []
+
+    def result(self) -> List[Point]:
+        if self.held is None:
+            return self.selected
+        if self.current:
+            self._close()
+        if self.pending:
+            self.selected.append(_largest_triangle(self.selected[-1], self.pending, self.held))
+            self.pending = None
+        self.selected.append(self.held)
+        self.held = None
+        return self.selected
+
+
+async def attempt_points(db: AsyncIOMotorClient, user_id: str) -> AsyncIterator[Point]:
+    cursor = db.attempts.find(
+        {"user_id": user_id},
+        {"_id": 0, "completed_at": 1, "score": 1, "quiz_title": 1}
+    ).sort("completed_at", 1)
+    async for attempt in cursor:
+        completed_at = attempt["completed_at"]
+        # Mongo returns naive UTC datetimes
+        yield Point(completed_at.replace(tzinfo=timezone.utc).timestamp(), attempt["score"], {
+            "date": completed_at.isoformat(),
+            "score": attempt["score"],
+            "quiz_title": attempt.get("quiz_title", "Unknown Quiz")
+        })
+
+
+async def lttb_timeline(db: AsyncIOMotorClient, user_id: str, points: int) -> List[Dict[str, Any]]:
+    """Individual attempts, reduced to at most points (at least 3) while keeping the shape of the score curve"""
+    total = await db.attempts.count_documents({"user_id": user_id})
+    if total <= points:
+        return [point.data async for point in attempt_points(db, user_id)]
+
+    reducer = LTTBReducer(total, points)
+    async for point in attempt_points(db, user_id):
+        reducer.add(point)
+    return [point.data for point in reducer.result()]
+
+
+async def score_timeline(
+    db: AsyncIOMotorClient,
+    user_id: str,
+    points: int,
+    granularity: str = DAY,
+    method: str = BUCKETS
+) -> List[Dict[str, Any]]:
+    if method == LTTB:
+        return await lttb_timeline(db, user_id, points)
+    buckets = await period_buckets(db, user_id, granularity)
+    return [bucket.point() for bucket in downsample_buckets(buckets, points)]
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from ..utils.config import get_settings
+
+settings = get_settings()
+
+
+def attempt_stats_update(attempt_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Update pipeline that counts attempts, adds their scores and appends their records in one write"""
+    return [
+        {"$set": {
+            "total_attempts": {"$add": [{"$ifNull": ["$total_attempts", 0]}, len(attempt_records)]},
+            "score_sum": {"$add": [{"$ifNull": ["$score_sum", 0]}, sum(record["score"] for record in attempt_records)]},
+            # Only the most recent attempts stay embedded; the full history lives in attempts
+            "quiz_attempts": {"$slice": [
+                {"$concatArrays": [
+                    {"$ifNull": ["$quiz_attempts", []]},
+                    [{"$literal": record} for record in attempt_records]
+                ]},
+                -settings.recent_attempts_limit
+            ]},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+        }},
+        {"$set": {
+            "average_score": {"$round": [{"$divide": ["$score_sum", "$total_attempts"]}, 2]}
+        }}
+    ]
+
+
+def attempt_record(attempt_id: str, attempt_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary of an attempt embedded in users.quiz_attempts"""
+    return {
+        "attempt_id": attempt_id,
+        "quiz_id": attempt_doc["quiz_id"],
+        "quiz_title": attempt_doc["quiz_title"],
+        "score": attempt_doc["score"],
+        "completed_at": attempt_doc["completed_at"],
+        "time_taken": attempt_doc.get("time_taken")
+    }
+
+
+def day_start(moment: datetime) -> datetime:
+    """Midnight UTC of the day moment falls on, as a naive datetime like the ones Mongo returns"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def daily_stats_updates(attempt_docs: List[Dict[str, Any]]) -> List[UpdateOne]:
+    """Upserts adding attempts to the user_daily_stats rollup, one per (user, day) touched"""
+    totals: Dict[Tuple[str, datetime], Dict[str, Any]] = {}
+    for doc in attempt_docs:
+        key = (doc["user_id"], day_start(doc["completed_at"]))
+        total = totals.setdefault(key, {"count": 0, "score_sum": 0.0, "seconds": 0, "min_score": 100.0, "best_score": 0.0})
+        total["count"] += 1
+        total["score_sum"] += doc["score"]
+        total["seconds"] += doc.get("time_taken") or 0
+        total["min_score"] = min(total["min_score"], doc["score"])
+        total["best_score"] = max(total["best_score"], doc["score"])
+
+    return [
+        UpdateOne(
+            {"_id": f"{user_id}:{day:%Y-%m-%d}"},
+            {
+                "$inc": {"count": total["count"], "score_sum": total["score_sum"], "seconds": total["seconds"]},
+                "$min": {"min_score": total["min_score"]},
+                "$max": {"best_score": total["best_score"]},
+                "$setOnInsert": {"user_id": user_id, "day": day}
+            },
+            upsert=True
+        )
+        for (user_id, day), total in totals.items()
+    ]
+
+
+async def record_daily_stats(db: AsyncIOMotorClient, attempt_docs: List[Dict[str, Any]]) -> None:
+    operations = daily_stats_updates(attempt_docs)
+    if operations:
+        await db.user_daily_stats.bulk_write(operations, ordered=False)
+
+
+def score_delta_update(delta: float) -> List[Dict[str, Any]]:
+    """Update pipeline that shifts score_sum by delta and recomputes average_score from it.
+
+    Applied in place, like attempt_stats_update, so submissions landing
+    concurrently are kept rather than overwritten by a recomputed total.
+    """
+    return [
+        {"$set": {
+            "score_sum": {"$add": [{"$ifNull": ["$score_sum", 0]}, delta]},
+            "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+        }},
+        {"$set": {
+            "average_score": {"$cond": [
+                {"$gt": [{"$ifNull": ["$total_attempts", 0]}, 0]},
+                {"$round": [{"$divide": ["$score_sum", "$total_attempts"]}, 2]},
+                0.0
+            ]}
+        }}
+    ]
+
+
+def daily_delta_updates(deltas: Dict[Tuple[str, datetime], float]) -> List[UpdateOne]:
+    """Shift score_sum of each (user, day) rollup by its delta; counts are unchanged by rescoring"""
+    return [
+        UpdateOne({"_id": f"{user_id}:{day:%Y-%m-%d}"}, {"$inc": {"score_sum": delta}})
+        for (user_id, day), delta in deltas.items()
+    ]
+
+
+async def refresh_daily_extremes(db: AsyncIOMotorClient, days: List[Tuple[str, datetime]]) -> None:
+    """Recompute min_score and best_score of rollup days whose attempts were rescored.
+
+    Only those two fields are replaced; a rescored attempt may have been
+    the day's minimum or best, which no delta can correct.
+    """
+    if not days:
+        return
+    pipeline = [
+        {"$match": {"$or": [
+            {"user_id": user_id, "completed_at": {"$gte": day, "$lt": day + timedelta(days=1)}}
+            for user_id, day in days
+        ]}},
+        {"$group": {
+            "_id": {"$concat": ["$user_id", ":", {"$dateToString": {"format": "%Y-%m-%d", "date": "$completed_at"}}]},
+            "min_score": {"$min": "$score"},
+            "best_score": {"$max": "$score"}
+        }},
+        {"$merge": {
+            "into": "user_daily_stats",
+            "whenMatched": [{"$set": {"min_score": "$$new.min_score", "best_score": "$$new.best_score"}}],
+            "whenNotMatched": "discard"
+        }}
+    ]
+    await db.attempts.aggregate(pipeline).to_list(None)
+
+
+async def rebuild_daily_stats(db: AsyncIOMotorClient, user_ids: Optional[List[str]] = None) -> None:
+    """Recompute rollup days from the attempts collection, e.g. after attempts were rescored"""
+    match = {"user_id": {"$in": user_ids}} if user_ids is not None else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$completed_at"}}
+            },
+            "count": {"$sum": 1},
+            "score_sum": {"$sum": "$score"},
+            "seconds": {"$sum": {"$ifNull": ["$time_taken", 0]}},
+            "min_score": {"$min": "$score"},
+            "best_score": {"$max": "$score"}
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.user_id", ":", "$_id.day"]},
+            "user_id": "$_id.user_id",
+            "day": {"$dateFromString": {"dateString": "$_id.day", "format": "%Y-%m-%d"}},
+            "count": 1,
+            "score_sum": 1,
+            "seconds": 1,
+            "min_score": 1,
+            "best_score": 1
+        }},
+        {"$merge": {"into": "user_daily_stats", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+    await db.attempts.aggregate(pipeline).to_list(None)
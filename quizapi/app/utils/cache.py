@@ -0,0 +1,59 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire at an absolute unix timestamp.
+
+    maxsize bounds the total weight of the entries; each entry weighs 1
+    unless set() is given another weight (e.g. its size in bytes).
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weight = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value, _ = entry
+        if expires_at <= time.time():
+            self.pop(key)
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None, weight: int = 1) -> None:
+        """Store value until expires_at, or for the default ttl when not given"""
+        if weight > self.maxsize:
+            return
+        if expires_at is None:
+            expires_at = time.time() + self.ttl if self.ttl is not None else float("inf")
+
+        self.pop(key)
+        self._data[key] = (expires_at, value, weight)
+        self.weight += weight
+        while self.weight > self.maxsize:
+            _, (_, _, evicted_weight) = self._data.popitem(last=False)
+            self.weight -= evicted_weight
+
+    def pop(self, key: Hashable) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.weight = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
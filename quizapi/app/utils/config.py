@@ -9,6 +9,84 @@ class Settings(BaseSettings):
     secret_key: str = "a_very_secret_key_that_should_be_in_an_env_file"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    token_cache_size: int = 10000
+
+    revocation_refresh_seconds: int = 10
+    revocation_rebuild_seconds: int = 3600
+    revocation_bloom_capacity: int = 100000
+    revocation_bloom_error_rate: float = 0.001
+    revocation_cache_size: int = 1024
+    revocation_negative_cache_seconds: int = 60
+
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: int = 60
+    user_invalidation_poll_seconds: int = 5
+
+    password_hash_executor: str = "thread"  # "thread" or "process"
+    password_hash_workers: int = 4
+    password_hash_max_concurrency: int = 8
+
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # "memory" (per worker) or "mongo" (shared)
+    rate_limit_window_seconds: int = 60
+    rate_limit_max_keys: int = 100000
+    rate_limit_trust_forwarded_for: bool = False
+    login_rate_limit_per_ip: int = 20
+    login_rate_limit_per_email: int = 5
+    register_rate_limit_per_ip: int = 5
+    register_rate_limit_per_email: int = 3
+
+    # Build the authenticated user from JWT claims instead of a per-request lookup
+    stateless_auth: bool = False
+    token_epoch_refresh_seconds: int = 10
+
+    # Default for --drop-unlisted of python -m app.db.indexes; startup never drops indexes
+    index_drop_unlisted: bool = False
+
+    quiz_cache_max_bytes: int = 64 * 1024 * 1024  # by serialized JSON size
+    quiz_cache_ttl_seconds: int = 300
+    quiz_invalidation_poll_seconds: int = 5  # fallback when change streams are unavailable
+
+    # Where new quizzes keep their questions: "embedded" in the quiz document,
+    # or "collection" for large banks (one document per question)
+    question_storage: str = "embedded"
+    question_page_size: int = 50
+    question_page_max: int = 500
+    question_stream_chunk_size: int = 200
+
+    # Attempt history pages and NDJSON exports
+    attempt_page_max: int = 100
+    attempt_stream_batch_size: int = 500
+
+    # Per-quiz leaderboards: entries kept in the persisted top list, and how
+    # many quizzes' lists each worker holds and for how long
+    leaderboard_size: int = 100
+    leaderboard_cache_size: int = 1000
+    leaderboard_cache_ttl_seconds: int = 30
+
+    # Score timelines are downsampled to at most this many points
+    timeline_default_points: int = 200
+    timeline_max_points: int = 2000
+
+    answer_key_cache_size: int = 1000
+    answer_key_cache_ttl_seconds: int = 300
+
+    recent_attempts_limit: int = 20  # attempts kept embedded in users.quiz_attempts
+
+    # Group-commit quiz submissions through an in-process write-behind queue
+    attempt_ingestion_enabled: bool = False
+    attempt_ingestion_batch_size: int = 200
+    attempt_ingestion_max_latency_ms: int = 50
+    attempt_ingestion_queue_size: int = 10000
+    attempt_ingestion_enqueue_timeout_seconds: float = 2.0
+
+    idempotency_key_ttl_seconds: int = 86400
+    idempotency_cache_size: int = 10000
+    idempotency_cache_ttl_seconds: int = 300
+    idempotency_wait_seconds: float = 10.0
+    idempotency_lease_seconds: float = 30.0  # a pending key older than this can be taken over
+
+    rescore_chunk_size: int = 5000
 
     debug: bool = False
     environment: str = "development"
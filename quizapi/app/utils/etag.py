@@ -0,0 +1,37 @@
+import hashlib
+from typing import Iterable, Optional
+
+from fastapi import Response
+
+
+def make_etag(*parts: object) -> str:
+    """Strong ETag built from the identity and stored version of a resource"""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def digest_etag(parts: Iterable[object]) -> str:
+    """Strong ETag for a collection of resources, e.g. (id, version) pairs of a page"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate If-None-Match, which compares entity tags weakly (RFC 9110 13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str = "no-cache") -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
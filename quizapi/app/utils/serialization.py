@@ -0,0 +1,177 @@
+from types import UnionType
+from typing import Annotated, Any, Callable, Dict, List, Optional, Type, Union, get_args, get_origin
+
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from .config import get_settings
+from ..schemas.attempt import Attempt
+from ..schemas.leaderboard import LeaderboardEntry
+from ..schemas.question import IndexedQuestion
+from ..schemas.quiz import Quiz, QuizSummary
+from ..schemas.user import User, UserDashboard
+
+# UTC datetimes end in "Z", as pydantic writes them
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson, writing BSON ObjectIds as strings"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def _to_float(value: Any) -> Any:
+    # Scores stored as whole numbers are written as floats, as the schema declares
+    return float(value) if isinstance(value, int) and not isinstance(value, bool) else value
+
+
+def _to_int(value: Any) -> Any:
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+
+def _converter(annotation: Any) -> Optional[Callable[[Any], Any]]:
+    """How a stored value is brought into the shape of annotation; None if it is written as stored"""
+    origin = get_origin(annotation)
+    if origin is Annotated:
+        return _converter(get_args(annotation)[0])
+    if origin is Union or origin is UnionType:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        inner = _converter(args[0]) if len(args) == 1 else None
+        if inner is None:
+            return None
+        return lambda value: None if value is None else inner(value)
+    if origin is list:
+        inner = _converter(get_args(annotation)[0]) if get_args(annotation) else None
+        if inner is None:
+            return None
+        return lambda value: [inner(item) for item in value] if isinstance(value, list) else value
+    if isinstance(annotation, type):
+        if issubclass(annotation, BaseModel):
+            projection = _projection(annotation)
+            return lambda value: projection.project(value) if isinstance(value, dict) else value
+        if annotation is float:
+            return _to_float
+        if annotation is int:
+            return _to_int
+    return None
+
+
+class _Projection:
+    """A model's fields compiled into (key, name, field, converter) tuples"""
+
+    def __init__(self):
+        self.fields: List[Any] = []
+
+    def compile(self, model: Type[BaseModel]) -> None:
+        self.fields = [
+            (field.alias or name, name, field, _converter(field.annotation))
+            for name, field in model.model_fields.items()
+        ]
+
+    def project(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only the model's fields, nested ones included, filling in defaults and coercing numbers"""
+        projected = {}
+        for key, name, field, convert in self.fields:
+            if key in doc:
+                value = doc[key]
+            elif name in doc:
+                value = doc[name]
+            elif field.is_required():
+                raise ValueError(f"Document {doc.get('_id')} is missing required field {key!r}")
+            else:
+                projected[key] = field.get_default(call_default_factory=True)
+                continue
+            projected[key] = convert(value) if convert is not None else value
+        return projected
+
+
+_projections: Dict[Type[BaseModel], _Projection] = {}
+
+
+def _projection(model: Type[BaseModel]) -> _Projection:
+    projection = _projections.get(model)
+    if projection is None:
+        # Registered before compiling, so a model that refers to itself reuses it
+        projection = _projections[model] = _Projection()
+        projection.compile(model)
+    return projection
+
+
+class JSONSerializer:
+    """Encodes Mongo documents straight to JSON in the shape of one response schema.
+
+    The schema's fields, down through nested models and lists of them, are
+    compiled once. Each document is projected onto them: stored fields the
+    schema lacks are dropped at every level, missing fields get their
+    defaults, and ints stored for float fields are written as floats (and
+    whole floats for int fields as ints). orjson then encodes the result. Stored documents were validated when they
+    were written, so they are not validated again. In debug mode the
+    precompiled TypeAdapter still validates every response, which catches
+    drift between stored documents and the schema.
+    """
+
+    def __init__(self, model: Type[BaseModel], many: bool = False):
+        self.many = many
+        self.projection = _projection(model)
+        self.adapter = TypeAdapter(List[model] if many else model)
+        self.validate = get_settings().debug
+
+    def _project(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return self.projection.project(doc)
+
+    def dump(self, data: Any) -> bytes:
+        if self.validate:
+            self.adapter.validate_python(data)
+        if self.many:
+            content = [self._project(doc) for doc in data]
+        else:
+            content = self._project(data)
+        return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+    def dump_lines(self, docs: List[Dict[str, Any]]) -> bytes:
+        """Encode documents as newline-delimited JSON, one document per line"""
+        if self.validate:
+            self.adapter.validate_python(docs)
+        return b"".join(
+            orjson.dumps(self._project(doc), default=_default, option=ORJSON_OPTIONS) + b"\n"
+            for doc in docs
+        )
+
+    def response(
+        self,
+        data: Any,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        """Routes return this directly, so FastAPI skips its own response_model pass"""
+        return Response(
+            content=self.dump(data),
+            status_code=status_code,
+            headers=headers,
+            media_type="application/json"
+        )
+
+
+quiz_serializer = JSONSerializer(Quiz)
+quizzes_serializer = JSONSerializer(Quiz, many=True)
+quiz_summaries_serializer = JSONSerializer(QuizSummary, many=True)
+indexed_question_serializer = JSONSerializer(IndexedQuestion)
+questions_serializer = JSONSerializer(IndexedQuestion, many=True)
+user_serializer = JSONSerializer(User)
+users_serializer = JSONSerializer(User, many=True)
+dashboard_serializer = JSONSerializer(UserDashboard)
+attempt_serializer = JSONSerializer(Attempt)
+attempts_serializer = JSONSerializer(Attempt, many=True)
+leaderboard_entry_serializer = JSONSerializer(LeaderboardEntry)
+leaderboard_serializer = JSONSerializer(LeaderboardEntry, many=True)
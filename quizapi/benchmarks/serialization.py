@@ -0,0 +1,113 @@
+"""Per-item cost of serializing list responses, before and after the shared serializers.
+
+Run from the quizapi directory:
+
+    python -m benchmarks.serialization
+
+"before" converts _id and datetimes by hand, then goes through FastAPI's
+response_model validation and JSONResponse. "after" hands the raw Mongo
+documents to the shared JSONSerializer. Both must produce the same JSON.
+"""
+import asyncio
+import copy
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.schemas.attempt import Attempt
+from app.schemas.user import User
+from app.utils.serialization import attempts_serializer, users_serializer
+
+
+def make_users(count: int) -> List[Dict[str, Any]]:
+    now = datetime(2025, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "email": f"user{i}@example.com",
+        "full_name": f"User {i}",
+        "hashed_password": "$2b$12$" + "x" * 53,
+        "is_active": True,
+        "is_admin": False,
+        "registration_date": now - timedelta(days=i),
+        "last_login": now,
+        "total_attempts": 20,
+        "average_score": 71.5,
+        "quiz_attempts": [{
+            "attempt_id": str(ObjectId()),
+            "quiz_id": str(ObjectId()),
+            "quiz_title": "Sample quiz",
+            "score": 70.0,
+            "completed_at": now,
+            "time_taken": 300
+        } for _ in range(20)]
+    } for i in range(count)]
+
+
+def make_attempts(count: int) -> List[Dict[str, Any]]:
+    now = datetime(2025, 1, 1)
+    return [{
+        "_id": ObjectId(),
+        "user_id": str(ObjectId()),
+        "quiz_id": str(ObjectId()),
+        "quiz_title": "Sample quiz",
+        "answers": [{"question_index": q, "selected_options": [q % 4]} for q in range(10)],
+        "score": 80.0,
+        "completed_at": now - timedelta(minutes=i),
+        "time_taken": 300
+    } for i in range(count)]
+
+
+def convert_by_hand(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """What the handlers did before: stringify _id and dates in a Python loop"""
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+        for field in ("registration_date", "last_login"):
+            if doc.get(field):
+                doc[field] = doc[field].isoformat()
+    return docs
+
+
+def fastapi_path(model: Any) -> Callable[[List[Dict[str, Any]]], bytes]:
+    field = create_model_field(name="response", type_=List[model], mode="serialization")
+
+    def run(docs: List[Dict[str, Any]]) -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=convert_by_hand(docs)))
+        return JSONResponse(content).body
+
+    return run
+
+
+def per_item_us(run: Callable[[List[Dict[str, Any]]], bytes], docs: List[Dict[str, Any]], rounds: int) -> float:
+    batches = [copy.deepcopy(docs) for _ in range(rounds)]  # the old path mutates its input
+    start = time.perf_counter()
+    for batch in batches:
+        run(batch)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(docs)) * 1e6
+
+
+def main() -> None:
+    cases = [
+        ("users", User, users_serializer, make_users),
+        ("attempts", Attempt, attempts_serializer, make_attempts),
+    ]
+    print(f"{'response':<10}{'items':>7}{'before us/item':>17}{'after us/item':>16}{'speedup':>10}")
+    for name, model, serializer, factory in cases:
+        for count in (100, 1000):
+            docs = factory(count)
+            expected = json.loads(fastapi_path(model)(copy.deepcopy(docs)))
+            assert json.loads(serializer.dump(docs)) == expected, f"{name} output differs"
+            rounds = max(3, 20000 // count)
+            before = per_item_us(fastapi_path(model), docs, rounds)
+            after = per_item_us(serializer.dump, docs, rounds)
+            print(f"{name:<10}{count:>7}{before:>17.2f}{after:>16.2f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
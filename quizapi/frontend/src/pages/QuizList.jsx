@@ -111,7 +111,7 @@ const QuizList = () => {
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
         {displayedQuizzes.map((quiz) => {
           const quizId = quiz.id || quiz._id;
-          const questionCount = quiz.questions?.length || 0;
+          const questionCount = quiz.question_count ?? quiz.questions?.length ?? 0;
 
           return (
             <div
@@ -130,7 +130,7 @@ const ManageQuizzes = () => {
                   <div className="flex items-center gap-4 text-sm text-gray-500 mb-4">
                     <div className="flex items-center gap-1">
                       <BookOpen className="h-4 w-4" />
-                      <span>{quiz.questions?.length || 0} questions</span>
+                      <span>{quiz.question_count ?? quiz.questions?.length ?? 0} questions</span>
                     </div>
                     {quiz.time_limit && (
                       <div className="flex items-center gap-1">
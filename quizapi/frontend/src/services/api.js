@@ -42,8 +42,11 @@ api.interceptors.response.use(
             refresh_token: refreshToken
           });
 
-          const { access_token } = response.data;
+          const { access_token, refresh_token } = response.data;
           localStorage.setItem('access_token', access_token);
+          if (refresh_token) {
+            localStorage.setItem('refresh_token', refresh_token);
+          }
 
           originalRequest.headers.Authorization = `Bearer ${access_token}`;
           return api(originalRequest);
@@ -107,8 +107,11 @@ class AuthService {
         refresh_token: refreshToken
       });
 
-      const { access_token } = response.data;
+      const { access_token, refresh_token } = response.data;
       localStorage.setItem('access_token', access_token);
+      if (refresh_token) {
+        localStorage.setItem('refresh_token', refresh_token);
+      }
 
       return access_token;
     } catch (error) {
@@ -4,8 +4,14 @@ class QuizService {
   // Get all quizzes
   async getAllQuizzes() {
     try {
-      const response = await api.get('/quizzes/');
-      return { success: true, data: response.data };
+      const quizzes = [];
+      let after = null;
+      do {
+        const response = await api.get('/quizzes/', { params: { limit: 200, after: after || undefined } });
+        quizzes.push(...response.data);
+        after = response.headers['x-next-cursor'];
+      } while (after);
+      return { success: true, data: quizzes };
     } catch (error) {
       return {
         success: false,